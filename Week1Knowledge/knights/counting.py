@@ -0,0 +1,255 @@
+import itertools
+
+from logic import *
+from sat import Encoder
+
+
+class Clauses():
+    """
+    Collects the clauses produced by an Encoder instead of solving them.
+    """
+
+    def __init__(self):
+        self.variables = 0
+        self.clauses = []
+
+    def new_variable(self):
+        self.variables += 1
+        return self.variables
+
+    def add_clause(self, clause):
+        self.clauses.append(frozenset(clause))
+
+
+def encode(sentence):
+    """
+    Returns an encoder and clauses that hold exactly when `sentence` does.
+
+    Every variable added by the encoder is defined as equivalent to a
+    subformula, so its value follows from the symbols: the clauses have
+    exactly one model for each model of the sentence.
+    """
+    Sentence.validate(sentence)
+    clauses = Clauses()
+    encoder = Encoder(clauses)
+    for clause in encoder.assertion(sentence):
+        clauses.add_clause(clause)
+    return encoder, clauses.clauses
+
+
+def variables_of(clauses):
+    """Returns the set of variables mentioned in some clause."""
+    return {abs(literal) for clause in clauses for literal in clause}
+
+
+def assign(clauses, literal):
+    """
+    Makes a literal true and propagates the unit clauses that follow,
+    along with any unit clauses already among `clauses`. Returns the remaining clauses and the literals assigned, or None if
+    some clause can no longer be satisfied.
+
+    Each variable is mapped to the clauses it occurs in, so propagating a
+    literal only visits those clauses, and each clause keeps a count of
+    its literals not yet made false to tell when it becomes a unit.
+    """
+    occurrences = dict()
+    for index, clause in enumerate(clauses):
+        for member in clause:
+            occurrences.setdefault(abs(member), []).append(index)
+    live = [len(clause) for clause in clauses]
+    satisfied = [False] * len(clauses)
+    value = dict()
+    assigned = []
+    pending = [literal] + [member for clause in clauses
+                           if len(clause) == 1 for member in clause]
+    while pending:
+        literal = pending.pop()
+        if value.get(abs(literal)) == (literal < 0):
+            return None
+        if abs(literal) in value:
+            continue
+        value[abs(literal)] = literal > 0
+        assigned.append(literal)
+        for index in occurrences.get(abs(literal), ()):
+            if satisfied[index]:
+                continue
+            if literal in clauses[index]:
+                satisfied[index] = True
+                continue
+            live[index] -= 1
+            if not live[index]:
+                return None
+            if live[index] == 1:
+                pending.extend(member for member in clauses[index]
+                               if abs(member) not in value)
+
+    # Drop satisfied clauses and the false literals of the rest
+    remaining = []
+    for index, clause in enumerate(clauses):
+        if satisfied[index]:
+            continue
+        if live[index] < len(clause):
+            clause = frozenset(member for member in clause
+                               if abs(member) not in value)
+        remaining.append(clause)
+    return remaining, assigned
+
+
+def components(clauses):
+    """
+    Splits clauses into groups that share no variables, joining the
+    groups of clauses with a variable in common as a union-find forest.
+    """
+    parent = list(range(len(clauses)))
+
+    def root(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    owner = dict()
+    for key, clause in enumerate(clauses):
+        for literal in clause:
+            other = owner.setdefault(abs(literal), key)
+            if other != key:
+                parent[root(other)] = root(key)
+    groups = dict()
+    for key, clause in enumerate(clauses):
+        groups.setdefault(root(key), []).append(clause)
+    return list(groups.values())
+
+
+def count_clauses(clauses, cache):
+    """
+    Counts the assignments to the variables in `clauses` that satisfy them,
+    caching the count of every independent component by its clauses.
+    """
+    if not clauses:
+        return 1
+    if not all(clauses):
+        return 0
+    key = frozenset(clauses)
+    if key in cache:
+        return cache[key]
+
+    parts = components(clauses)
+    if len(parts) > 1:
+        total = 1
+        for part in parts:
+            total *= count_clauses(part, cache)
+            if not total:
+                break
+        cache[key] = total
+        return total
+
+    occurrences = dict()
+    for clause in clauses:
+        for literal in clause:
+            occurrences[abs(literal)] = occurrences.get(abs(literal), 0) + 1
+    variables = len(occurrences)
+
+    # A unit clause leaves one value to try. Otherwise branch on the
+    # variable that appears in the most clauses, breaking ties by taking
+    # the middle one in order of appearance, so that long chains of
+    # clauses split in half rather than losing one variable at a time
+    unit = next((clause for clause in clauses if len(clause) == 1), None)
+    if unit is not None:
+        literals = tuple(unit)
+    else:
+        most = max(occurrences.values())
+        tied = [v for v in occurrences if occurrences[v] == most]
+        variable = tied[len(tied) // 2]
+        literals = (variable, -variable)
+
+    total = 0
+    for literal in literals:
+        result = assign(clauses, literal)
+        if result is None:
+            continue
+        remaining, assigned = result
+
+        # Variables that disappeared without being assigned are free
+        free = variables - len(assigned) - len(variables_of(remaining))
+        total += count_clauses(remaining, cache) << free
+
+    cache[key] = total
+    return total
+
+
+def count_models(sentence, symbols=None):
+    """
+    Returns the number of models of `sentence`, as assignments to its own
+    symbols, or to every name in `symbols` if given.
+    """
+    encoder, clauses = encode(sentence)
+    names = set(encoder.variables)
+    if symbols is not None:
+        symbols = set(symbols)
+        if not names <= symbols:
+            raise Exception("symbols must include every symbol in sentence")
+        names = symbols
+
+    # Symbols mentioned by no clause can take either value
+    unused = len(names) - len(set(encoder.variables) & names)
+    free = len(set(encoder.variables.values()) - variables_of(clauses))
+    return count_clauses(clauses, dict()) << (free + unused)
+
+
+def all_models(sentence, symbols=None):
+    """
+    Yields every model of `sentence` one at a time, as a dictionary from
+    symbol name to truth value. Models are built on demand, so only the
+    current branch of the search is held in memory.
+    """
+    encoder, clauses = encode(sentence)
+    names = sorted(encoder.variables)
+    if symbols is not None:
+        if not set(names) <= set(symbols):
+            raise Exception("symbols must include every symbol in sentence")
+        names = sorted(symbols)
+    variables = {encoder.variables[name] for name in names
+                 if name in encoder.variables}
+
+    def search(clauses, model):
+        """Yields models extending a partial assignment of symbols."""
+        if not all(clauses):
+            return
+        mentioned = variables_of(clauses)
+        branch = [v for v in variables if v in mentioned and v not in model]
+
+        # Once every mentioned symbol is fixed, the rest is determined
+        if not branch:
+            if not clauses or count_clauses(clauses, dict()):
+                yield from complete(model)
+            return
+
+        variable = min(branch)
+        for literal in (variable, -variable):
+            result = assign(clauses, literal)
+            if result is None:
+                continue
+            yield from search(*extend(model, *result))
+
+    def extend(model, clauses, assigned):
+        """Records the symbols among newly assigned literals."""
+        model = dict(model)
+        for literal in assigned:
+            if abs(literal) in variables:
+                model[abs(literal)] = literal > 0
+        return clauses, model
+
+    def complete(model):
+        """Yields the model with each unassigned symbol set both ways."""
+        missing = [name for name in names
+                   if encoder.variables.get(name) not in model]
+        assignment = {name: model[encoder.variables[name]]
+                      for name in names if name not in missing}
+        for values in itertools.product([True, False], repeat=len(missing)):
+            result = dict(assignment)
+            result.update(zip(missing, values))
+            yield result
+
+    result = assign(clauses, encoder.true)
+    if result is not None:
+        yield from search(*extend(dict(), *result))
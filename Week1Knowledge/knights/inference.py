@@ -0,0 +1,255 @@
+import collections
+import itertools
+
+from logic import *
+from sat import KnowledgeBase
+
+# Result of a query, along with the name of the engine that answered it
+Answer = collections.namedtuple("Answer", ["entailed", "engine"])
+
+# Most clauses a conversion to CNF may produce before giving up
+CNF_LIMIT = 10000
+
+# Most clauses resolution may hold before handing over to the SAT solver
+RESOLUTION_LIMIT = 2000
+
+
+class TooLarge(Exception):
+    """Raised when a conversion or proof grows past its limit."""
+
+
+def cnf(sentence, positive=True):
+    """
+    Converts a sentence (or its negation) to conjunctive normal form.
+    Returns a list of clauses, each a frozenset of (name, value) literals,
+    without adding any new symbols. Raises TooLarge past CNF_LIMIT clauses.
+    """
+    if isinstance(sentence, Symbol):
+        return [frozenset([(sentence.name, positive)])]
+    if isinstance(sentence, Not):
+        return cnf(sentence.operand, not positive)
+    if isinstance(sentence, And):
+        operands = [(conjunct, positive) for conjunct in sentence.conjuncts]
+        conjunction = positive
+    elif isinstance(sentence, Or):
+        operands = [(disjunct, positive) for disjunct in sentence.disjuncts]
+        conjunction = not positive
+    elif isinstance(sentence, Implication):
+        operands = [(sentence.antecedent, not positive),
+                    (sentence.consequent, positive)]
+        conjunction = not positive
+    elif isinstance(sentence, Biconditional):
+        left, right = sentence.left, sentence.right
+        if positive:
+            return (cnf(Implication(left, right))
+                    + cnf(Implication(right, left)))
+        return cnf(Or(left, right)) + cnf(Or(Not(left), Not(right)))
+    else:
+        raise TypeError("must be a logical sentence")
+
+    # A conjunction just collects the clauses of its operands
+    if conjunction:
+        clauses = []
+        for operand, value in operands:
+            clauses.extend(cnf(operand, value))
+            if len(clauses) > CNF_LIMIT:
+                raise TooLarge("CNF too large")
+        return clauses
+
+    # A disjunction distributes over the clauses of its operands
+    clauses = [frozenset()]
+    for operand, value in operands:
+        operand_clauses = cnf(operand, value)
+
+        # Check the size before building the product, which can be huge
+        if len(clauses) * len(operand_clauses) > CNF_LIMIT:
+            raise TooLarge("CNF too large")
+        clauses = [
+            a | b for a, b in itertools.product(clauses, operand_clauses)
+            if not tautology(a | b)
+        ]
+        if len(clauses) > CNF_LIMIT:
+            raise TooLarge("CNF too large")
+    return clauses
+
+
+def tautology(clause):
+    """Checks if a clause contains a literal and its negation."""
+    return any((name, not value) in clause for name, value in clause)
+
+
+def horn(clauses):
+    """Checks if every clause has at most one positive literal."""
+    return all(
+        sum(1 for _, value in clause if value) <= 1 for clause in clauses
+    )
+
+
+class ForwardChaining():
+    """
+    Horn clause knowledge base answered by forward chaining.
+
+    Each clause is indexed by the symbols in its body, with a count of the
+    body symbols not yet inferred. Inferring a symbol only visits the
+    clauses that use it, so each query takes time linear in the size of the
+    knowledge base. Clauses without a positive literal conclude a
+    contradiction.
+    """
+
+    def __init__(self, clauses):
+        self.facts = []
+        self.counts = []
+        self.heads = []
+        self.uses = collections.defaultdict(list)
+        self.contradiction = False
+        for clause in clauses:
+            self.add(clause)
+
+    def add(self, clause):
+        body = [name for name, value in clause if not value]
+        head = next((name for name, value in clause if value), None)
+        if not body:
+            if head is None:
+                self.contradiction = True
+            else:
+                self.facts.append(head)
+            return
+        for name in body:
+            self.uses[name].append(len(self.counts))
+        self.counts.append(len(body))
+        self.heads.append(head)
+
+    def inconsistent(self, facts=(), goals=()):
+        """
+        Checks if the knowledge base, together with extra facts that are
+        true and goals that are false, derives a contradiction.
+        """
+        if self.contradiction:
+            return True
+        goals = set(goals)
+        counts = list(self.counts)
+        inferred = set()
+        agenda = list(self.facts) + list(facts)
+        while agenda:
+            name = agenda.pop()
+            if name in inferred:
+                continue
+            if name in goals:
+                return True
+            inferred.add(name)
+            for index in self.uses.get(name, ()):
+                counts[index] -= 1
+                if counts[index] == 0:
+                    if self.heads[index] is None:
+                        return True
+                    agenda.append(self.heads[index])
+        return False
+
+    def entails(self, query_clauses):
+        """
+        Checks if every clause of query follows. The negation of a clause
+        is a set of unit literals, which keeps the problem Horn.
+        """
+        return all(
+            self.inconsistent(
+                facts=[name for name, value in clause if not value],
+                goals=[name for name, value in clause if value]
+            )
+            for clause in query_clauses
+        )
+
+
+def resolve(a, b):
+    """Returns every resolvent of two clauses that is not a tautology."""
+    resolvents = []
+    for name, value in a:
+        if (name, not value) in b:
+            resolvent = (a - {(name, value)}) | (b - {(name, not value)})
+            if not tautology(resolvent):
+                resolvents.append(resolvent)
+    return resolvents
+
+
+def resolution(clauses):
+    """
+    Checks if a set of clauses is unsatisfiable by saturating it with
+    resolvents. Raises TooLarge past RESOLUTION_LIMIT clauses.
+    """
+    clauses = {clause for clause in clauses if not tautology(clause)}
+    if frozenset() in clauses:
+        return True
+    pending = list(clauses)
+    while pending:
+        clause = pending.pop()
+        for other in list(clauses):
+            for resolvent in resolve(clause, other):
+                if not resolvent:
+                    return True
+                if resolvent not in clauses:
+                    clauses.add(resolvent)
+                    pending.append(resolvent)
+                    if len(clauses) > RESOLUTION_LIMIT:
+                        raise TooLarge("too many resolvents")
+    return False
+
+
+class Inference():
+    """
+    Answers entailment queries against a knowledge base, choosing the
+    engine automatically: forward chaining if the knowledge base is a set
+    of Horn clauses, otherwise resolution while the clause set stays small,
+    and the SAT solver for everything else.
+    """
+
+    def __init__(self, knowledge):
+        Sentence.validate(knowledge)
+        self.knowledge = knowledge
+        try:
+            self.clauses = cnf(knowledge)
+        except TooLarge:
+            self.clauses = None
+        self.chaining = None
+        if self.clauses is not None and horn(self.clauses):
+            self.chaining = ForwardChaining(self.clauses)
+        self.solver = None
+
+    def ask(self, query, engine=None):
+        """
+        Checks if the knowledge base entails query. Returns an Answer with
+        the result and which engine ("forward chaining", "resolution" or
+        "sat") produced it. `engine` forces a particular engine.
+        """
+        Sentence.validate(query)
+        if engine not in (None, "forward chaining", "resolution", "sat"):
+            raise ValueError(f"unknown engine {engine}")
+        try:
+            query_clauses = cnf(query)
+        except TooLarge:
+            query_clauses = None
+
+        if engine in (None, "forward chaining"):
+            if self.chaining is not None and query_clauses is not None:
+                return Answer(self.chaining.entails(query_clauses),
+                              "forward chaining")
+            if engine is not None:
+                raise ValueError("forward chaining needs Horn clauses")
+
+        if engine in (None, "resolution"):
+            try:
+                if self.clauses is None:
+                    raise TooLarge("CNF too large")
+                negated = cnf(query, False)
+                return Answer(resolution(self.clauses + negated),
+                              "resolution")
+            except TooLarge:
+                if engine is not None:
+                    raise
+
+        if self.solver is None:
+            self.solver = KnowledgeBase(self.knowledge)
+        return Answer(self.solver.ask(query), "sat")
+
+
+def entails(knowledge, query, engine=None):
+    """Checks if knowledge entails query, reporting the engine used."""
+    return Inference(knowledge).ask(query, engine)
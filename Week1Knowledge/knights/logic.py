@@ -1,8 +1,22 @@
 import itertools
+import multiprocessing
+import os
+import weakref
 
 
 class Sentence():
 
+    __slots__ = ("_hash", "_symbols", "_generation", "_mutable",
+                 "__weakref__")
+
+    # Every live sentence keyed by its structure, so that building the same
+    # subformula twice returns the object that already exists
+    interned = weakref.WeakValueDictionary()
+
+    # Counts modifications to And sentences, which invalidate the cached
+    # values of every sentence containing one
+    changes = 0
+
     def evaluate(self, model):
         """Evaluates the logical sentence."""
         raise Exception("nothing to evaluate")
@@ -13,7 +27,62 @@ class Sentence():
 
     def symbols(self):
         """Returns a set of all symbols in the logical sentence."""
-        return set()
+        return set(self.symbol_set())
+
+    def symbol_set(self):
+        """Returns the cached frozenset of all symbols in the sentence."""
+        if self.stale(self._symbols):
+            self._symbols = frozenset().union(
+                *[operand.symbol_set() for operand in self.operands()]
+            )
+        return self._symbols
+
+    def operands(self):
+        """Returns the list of sentences this sentence is built from."""
+        return []
+
+    def bitwise(self, operands):
+        """Returns a bitwise Python expression over compiled operands."""
+        raise Exception("nothing to compile")
+
+    def __reduce__(self):
+        return (type(self), tuple(self.operands()))
+
+    @classmethod
+    def intern(cls, *key):
+        """Returns the live sentence with a given structure, or a new one."""
+        key = (cls,) + key
+        sentence = Sentence.interned.get(key)
+        if sentence is None:
+            sentence = object.__new__(cls)
+            Sentence.interned[key] = sentence
+        return sentence
+
+    def initialized(self):
+        """Checks if an interned sentence was already constructed."""
+        return hasattr(self, "_mutable")
+
+    def cache(self, mutable=False):
+        """Sets up cached values once the operands are known."""
+        self._hash = None
+        self._symbols = None
+        self._generation = Sentence.changes
+        self._mutable = mutable or any(
+            operand._mutable for operand in self.operands()
+        )
+
+    def stale(self, value):
+        """Checks if a cached value must be recomputed."""
+        if self._mutable and self._generation != Sentence.changes:
+            self._hash = None
+            self._symbols = None
+            self._generation = Sentence.changes
+            return True
+        return value is None
+
+    def interned_with(self, other):
+        """Checks if two sentences can only be equal by being identical."""
+        return not (self._mutable or other._mutable)
 
     @classmethod
     def validate(cls, sentence):
@@ -44,18 +113,33 @@ class Sentence():
 
 class Symbol(Sentence):
 
+    __slots__ = ("name",)
+
+    def __new__(cls, name):
+        return cls.intern(name)
+
     def __init__(self, name):
+        if self.initialized():
+            return
         self.name = name
+        self.cache()
+        self._hash = hash(("symbol", self.name))
+        self._symbols = frozenset([self.name])
 
     def __eq__(self, other):
-        return isinstance(other, Symbol) and self.name == other.name
+        return self is other or (
+            isinstance(other, Symbol) and self.name == other.name
+        )
 
     def __hash__(self):
-        return hash(("symbol", self.name))
+        return self._hash
 
     def __repr__(self):
         return self.name
 
+    def __reduce__(self):
+        return (Symbol, (self.name,))
+
     def evaluate(self, model):
         try:
             return bool(model[self.name])
@@ -65,20 +149,37 @@ class Symbol(Sentence):
     def formula(self):
         return self.name
 
-    def symbols(self):
-        return {self.name}
+    def symbol_set(self):
+        return self._symbols
+
+    def bitwise(self, operands):
+        raise Exception("symbols are compiled by index")
 
 
 class Not(Sentence):
+
+    __slots__ = ("operand",)
+
+    def __new__(cls, operand):
+        return cls.intern(id(operand))
+
     def __init__(self, operand):
+        if self.initialized():
+            return
         Sentence.validate(operand)
         self.operand = operand
+        self.cache()
 
     def __eq__(self, other):
-        return isinstance(other, Not) and self.operand == other.operand
+        return self is other or (
+            isinstance(other, Not) and not self.interned_with(other)
+            and self.operand == other.operand
+        )
 
     def __hash__(self):
-        return hash(("not", hash(self.operand)))
+        if self.stale(self._hash):
+            self._hash = hash(("not", hash(self.operand)))
+        return self._hash
 
     def __repr__(self):
         return f"Not({self.operand})"
@@ -89,23 +190,35 @@ class Not(Sentence):
     def formula(self):
         return "¬" + Sentence.parenthesize(self.operand.formula())
 
-    def symbols(self):
-        return self.operand.symbols()
+    def operands(self):
+        return [self.operand]
+
+    def bitwise(self, operands):
+        return f"full ^ {operands[0]}"
 
 
 class And(Sentence):
+
+    __slots__ = ("conjuncts",)
+
+    # And sentences can grow through `add`, so they are never shared
     def __init__(self, *conjuncts):
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
         self.conjuncts = list(conjuncts)
+        self.cache(mutable=True)
 
     def __eq__(self, other):
-        return isinstance(other, And) and self.conjuncts == other.conjuncts
+        return self is other or (
+            isinstance(other, And) and self.conjuncts == other.conjuncts
+        )
 
     def __hash__(self):
-        return hash(
-            ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
-        )
+        if self.stale(self._hash):
+            self._hash = hash(
+                ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
+            )
+        return self._hash
 
     def __repr__(self):
         conjunctions = ", ".join(
@@ -116,6 +229,7 @@ class And(Sentence):
     def add(self, conjunct):
         Sentence.validate(conjunct)
         self.conjuncts.append(conjunct)
+        Sentence.changes += 1
 
     def evaluate(self, model):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
@@ -126,23 +240,40 @@ class And(Sentence):
         return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
                            for conjunct in self.conjuncts])
 
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+    def operands(self):
+        return self.conjuncts
+
+    def bitwise(self, operands):
+        return " & ".join(operands) or "full"
 
 
 class Or(Sentence):
+
+    __slots__ = ("disjuncts",)
+
+    def __new__(cls, *disjuncts):
+        return cls.intern(*[id(disjunct) for disjunct in disjuncts])
+
     def __init__(self, *disjuncts):
+        if self.initialized():
+            return
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
         self.disjuncts = list(disjuncts)
+        self.cache()
 
     def __eq__(self, other):
-        return isinstance(other, Or) and self.disjuncts == other.disjuncts
+        return self is other or (
+            isinstance(other, Or) and not self.interned_with(other)
+            and self.disjuncts == other.disjuncts
+        )
 
     def __hash__(self):
-        return hash(
-            ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
-        )
+        if self.stale(self._hash):
+            self._hash = hash(
+                ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
+            )
+        return self._hash
 
     def __repr__(self):
         disjuncts = ", ".join([str(disjunct) for disjunct in self.disjuncts])
@@ -157,24 +288,42 @@ class Or(Sentence):
         return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
                             for disjunct in self.disjuncts])
 
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+    def operands(self):
+        return self.disjuncts
+
+    def bitwise(self, operands):
+        return " | ".join(operands) or "0"
 
 
 class Implication(Sentence):
+
+    __slots__ = ("antecedent", "consequent")
+
+    def __new__(cls, antecedent, consequent):
+        return cls.intern(id(antecedent), id(consequent))
+
     def __init__(self, antecedent, consequent):
+        if self.initialized():
+            return
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
         self.antecedent = antecedent
         self.consequent = consequent
+        self.cache()
 
     def __eq__(self, other):
-        return (isinstance(other, Implication)
-                and self.antecedent == other.antecedent
-                and self.consequent == other.consequent)
+        return self is other or (
+            isinstance(other, Implication) and not self.interned_with(other)
+            and self.antecedent == other.antecedent
+            and self.consequent == other.consequent
+        )
 
     def __hash__(self):
-        return hash(("implies", hash(self.antecedent), hash(self.consequent)))
+        if self.stale(self._hash):
+            self._hash = hash(
+                ("implies", hash(self.antecedent), hash(self.consequent))
+            )
+        return self._hash
 
     def __repr__(self):
         return f"Implication({self.antecedent}, {self.consequent})"
@@ -188,24 +337,42 @@ class Implication(Sentence):
         consequent = Sentence.parenthesize(self.consequent.formula())
         return f"{antecedent} => {consequent}"
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
+    def operands(self):
+        return [self.antecedent, self.consequent]
+
+    def bitwise(self, operands):
+        return f"(full ^ {operands[0]}) | {operands[1]}"
 
 
 class Biconditional(Sentence):
+
+    __slots__ = ("left", "right")
+
+    def __new__(cls, left, right):
+        return cls.intern(id(left), id(right))
+
     def __init__(self, left, right):
+        if self.initialized():
+            return
         Sentence.validate(left)
         Sentence.validate(right)
         self.left = left
         self.right = right
+        self.cache()
 
     def __eq__(self, other):
-        return (isinstance(other, Biconditional)
-                and self.left == other.left
-                and self.right == other.right)
+        return self is other or (
+            isinstance(other, Biconditional) and not self.interned_with(other)
+            and self.left == other.left
+            and self.right == other.right
+        )
 
     def __hash__(self):
-        return hash(("biconditional", hash(self.left), hash(self.right)))
+        if self.stale(self._hash):
+            self._hash = hash(
+                ("biconditional", hash(self.left), hash(self.right))
+            )
+        return self._hash
 
     def __repr__(self):
         return f"Biconditional({self.left}, {self.right})"
@@ -217,47 +384,178 @@ class Biconditional(Sentence):
                     and not self.right.evaluate(model)))
 
     def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
+        left = Sentence.parenthesize(self.left.formula())
+        right = Sentence.parenthesize(self.right.formula())
         return f"{left} <=> {right}"
 
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
-
+    def operands(self):
+        return [self.left, self.right]
+
+    def bitwise(self, operands):
+        return f"full ^ {operands[0]} ^ {operands[1]}"
+
+
+class CompiledSentence():
+    """
+    A logical sentence compiled into straight-line Python code.
+
+    Symbols are addressed by their position in `symbols` instead of by
+    name, and every operator is a bitwise operation, so a single call can
+    evaluate many models at once: bit k of each symbol's value holds its
+    truth value in the k-th model, and `full` has every model's bit set.
+    Python integers give arbitrarily wide batches; NumPy unsigned integer
+    arrays work as well (64 models per word).
+    """
+
+    def __init__(self, sentence, symbols=None):
+        Sentence.validate(sentence)
+        self.sentence = sentence
+        if symbols is None:
+            symbols = sorted(sentence.symbols())
+        self.symbols = list(symbols)
+        self.index = {name: i for i, name in enumerate(self.symbols)}
+        self.function = self.build(sentence)
+
+    def build(self, sentence):
+        """Generates one assignment per distinct subformula."""
+        lines = []
+        names = dict()
+        stack = [(sentence, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node in names:
+                continue
+            if isinstance(node, Symbol):
+                if node.name not in self.index:
+                    raise Exception(f"variable {node.name} not in symbols")
+                expression = f"v[{self.index[node.name]}]"
+            elif not expanded:
+                stack.append((node, True))
+                stack.extend((operand, False)
+                             for operand in reversed(node.operands()))
+                continue
+            else:
+                expression = node.bitwise(
+                    [names[operand] for operand in node.operands()]
+                )
+            names[node] = f"t{len(names)}"
+            lines.append(f"    {names[node]} = {expression}")
+        source = "\n".join(
+            ["def compiled(v, full):"] + lines + [f"    return {names[sentence]}"]
+        )
+        scope = dict()
+        exec(source, scope)
+        return scope["compiled"]
 
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+    def evaluate(self, model):
+        """Evaluates the compiled sentence in a single model."""
+        try:
+            values = [1 if model[name] else 0 for name in self.symbols]
+        except KeyError as e:
+            raise Exception(f"variable {e.args[0]} not in model")
+        return bool(self.function(values, 1))
 
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
+    def evaluate_bits(self, values, full):
+        """Evaluates the compiled sentence in a batch of models."""
+        return self.function(values, full)
 
-        # If model has an assignment for each symbol
-        if not symbols:
 
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
-        else:
+def truth_table(width):
+    """Returns bitsets enumerating all models of the first `width` symbols."""
+    full = (1 << (1 << width)) - 1
+    columns = []
+    for i in range(width):
+        period = 1 << (i + 1)
+        block = ((1 << (1 << i)) - 1) << (1 << i)
+        columns.append(block * (full // ((1 << period) - 1)))
+    return columns, full
 
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
 
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
+# Number of symbols enumerated inside a single bitset by model_check
+BATCH_SYMBOLS = 10
 
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
 
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+def model_check(knowledge, query):
+    """Checks if knowledge base entails query."""
 
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
-
-    # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+
+    # Compile both sentences over the same symbol indices
+    knowledge = CompiledSentence(knowledge, symbols)
+    query = CompiledSentence(query, symbols)
+    return check_partition(knowledge, query, ())
+
+
+def check_partition(knowledge, query, fixed, stop=None):
+    """
+    Checks if query holds in every model of knowledge in which the first
+    symbols take the values in `fixed`. Both sentences must be compiled
+    over the same symbols. Gives up early once `stop` is set.
+    """
+    free = len(knowledge.symbols) - len(fixed)
+
+    # The next symbols vary inside each batch, the rest are fixed per batch
+    width = min(free, BATCH_SYMBOLS)
+    columns, full = truth_table(width)
+    prefix = [full if value else 0 for value in fixed] + columns
+    for batch in range(1 << (free - width)):
+        if stop is not None and stop.is_set():
+            return True
+        values = prefix + [
+            full if (batch >> i) & 1 else 0
+            for i in range(free - width)
+        ]
+
+        # If knowledge base is true in a model, then query must also be true
+        holds = knowledge.evaluate_bits(values, full)
+        if holds & ~query.evaluate_bits(values, full):
+            return False
+    return True
+
+
+# Compiled sentences and stop signal of a model checking worker process
+worker = dict()
+
+
+def start_worker(knowledge, query, symbols, stop):
+    """Compiles the sentences once in each worker process."""
+    worker["knowledge"] = CompiledSentence(knowledge, symbols)
+    worker["query"] = CompiledSentence(query, symbols)
+    worker["stop"] = stop
+
+
+def check_worker(fixed):
+    """Checks one partition of the models inside a worker process."""
+    return check_partition(
+        worker["knowledge"], worker["query"], fixed, worker["stop"]
+    )
+
+
+def model_check_parallel(knowledge, query, split=None, processes=None):
+    """
+    Checks if knowledge base entails query, splitting the models on the
+    values of the first `split` symbols into independent partitions that
+    are checked across a pool of processes. As soon as one partition finds
+    a model where knowledge holds but query does not, the others stop.
+    """
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    # By default, aim for a few partitions per process to balance the load
+    if split is None:
+        split = (4 * processes - 1).bit_length()
+    split = max(0, min(split, len(symbols)))
+
+    stop = multiprocessing.Event()
+    with multiprocessing.Pool(
+        processes, initializer=start_worker,
+        initargs=(knowledge, query, symbols, stop)
+    ) as pool:
+        partitions = itertools.product([True, False], repeat=split)
+        for holds in pool.imap_unordered(check_worker, partitions):
+            if not holds:
+                stop.set()
+                return False
+    return True
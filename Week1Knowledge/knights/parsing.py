@@ -0,0 +1,201 @@
+import re
+
+from logic import *
+
+# Every token of a formula, matched in a single pass over the text.
+# Symbol names are runs of words separated by spaces, as in formula(),
+# or any text in double quotes.
+TOKENS = re.compile(r"""
+    \s*(?:
+        (?P<biconditional> <=> | <-> | ↔ )
+      | (?P<implication> => | -> | → )
+      | (?P<not> ¬ | ~ | ! )
+      | (?P<and> ∧ | & )
+      | (?P<or> ∨ | \| )
+      | (?P<open> \( )
+      | (?P<close> \) )
+      | "(?P<quoted> [^"]* )"
+      | (?P<name> [\w.']+ (?: [ \t]+ [\w.']+ )* )
+    )\s*
+""", re.VERBOSE)
+
+
+def tokenize(text):
+    """
+    Yields (kind, value) pairs for each token in a formula.
+    """
+    position = 0
+    while position < len(text):
+        match = TOKENS.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"unexpected character at {position}: {text!r}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind == "quoted":
+            yield "name", match.group("quoted")
+        else:
+            yield kind, match.group(kind)
+
+
+class Parser():
+    """
+    Recursive descent parser from formula strings to logical sentences.
+
+    From tightest to loosest, operators bind in the order ¬, ∧, ∨, =>, <=>.
+    Chains of ∧ or ∨ become a single And or Or, and => groups to the right.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = list(tokenize(text))
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def take(self, kind):
+        if self.peek() != kind:
+            found = self.peek() or "end of formula"
+            raise ValueError(f"expected {kind}, found {found}: {self.text!r}")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token[1]
+
+    def parse(self):
+        """Returns the sentence described by the whole text."""
+        sentence = self.biconditional()
+        if self.peek() is not None:
+            raise ValueError(
+                f"unexpected {self.peek()} after formula: {self.text!r}"
+            )
+        return sentence
+
+    def biconditional(self):
+        left = self.implication()
+        while self.peek() == "biconditional":
+            self.take("biconditional")
+            left = Biconditional(left, self.implication())
+        return left
+
+    def implication(self):
+        antecedent = self.disjunction()
+        if self.peek() == "implication":
+            self.take("implication")
+            return Implication(antecedent, self.implication())
+        return antecedent
+
+    def disjunction(self):
+        disjuncts = [self.conjunction()]
+        while self.peek() == "or":
+            self.take("or")
+            disjuncts.append(self.conjunction())
+        return disjuncts[0] if len(disjuncts) == 1 else Or(*disjuncts)
+
+    def conjunction(self):
+        conjuncts = [self.negation()]
+        while self.peek() == "and":
+            self.take("and")
+            conjuncts.append(self.negation())
+        return conjuncts[0] if len(conjuncts) == 1 else And(*conjuncts)
+
+    def negation(self):
+        if self.peek() == "not":
+            self.take("not")
+            return Not(self.negation())
+        if self.peek() == "open":
+            self.take("open")
+            sentence = self.biconditional()
+            self.take("close")
+            return sentence
+        return Symbol(self.take("name"))
+
+
+def parse(text):
+    """
+    Parses a formula such as "A ∧ ¬B => C" into a logical sentence.
+    Accepts the output of Sentence.formula() as well as ASCII operators.
+    """
+    return Parser(text).parse()
+
+
+def read_formulas(lines):
+    """
+    Yields a sentence for each line holding a formula, skipping blank lines
+    and lines starting with "#". Lines are read one at a time, so any
+    iterable of lines (such as an open file) is streamed.
+    """
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield parse(line)
+
+
+def load_knowledge(filename):
+    """
+    Loads a knowledge base from a file with one formula per line.
+    """
+    with open(filename, encoding="utf-8") as f:
+        return And(*read_formulas(f))
+
+
+def dimacs_clauses(lines):
+    """
+    Yields each clause of a DIMACS CNF file as a list of integer literals.
+    Clauses may span several lines and end with 0; comment lines, the
+    "p cnf" header and a trailing "%" end marker are skipped.
+    """
+    clause = []
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] in "cp":
+            continue
+        if line[0] == "%":
+            break
+        for literal in map(int, line.split()):
+            if literal == 0:
+                yield clause
+                clause = []
+            else:
+                clause.append(literal)
+    if clause:
+        yield clause
+
+
+def read_dimacs(filename):
+    """
+    Loads a DIMACS CNF file as a conjunction of disjunctions, naming
+    each variable by its number.
+    """
+    symbols = dict()
+
+    def literal(number):
+        """Returns the sentence for a literal, sharing one Symbol per variable."""
+        if abs(number) not in symbols:
+            symbols[abs(number)] = Symbol(str(abs(number)))
+        symbol = symbols[abs(number)]
+        return symbol if number > 0 else Not(symbol)
+
+    with open(filename) as f:
+        return And(*(
+            Or(*[literal(number) for number in clause])
+            for clause in dimacs_clauses(f)
+        ))
+
+
+def load_dimacs(filename, solver):
+    """
+    Adds the clauses of a DIMACS CNF file straight to an empty sat.Solver,
+    without building sentences. DIMACS variable v is solver variable v.
+    Returns the number of clauses added.
+    """
+    count = 0
+    with open(filename) as f:
+        for clause in dimacs_clauses(f):
+            highest = max((abs(literal) for literal in clause), default=0)
+            while len(solver.values) <= highest:
+                solver.new_variable()
+            solver.add_clause(clause)
+            count += 1
+    return count
@@ -1,5 +1,6 @@
 from pickle import TRUE
 from logic import *
+from sat import KnowledgeBase
 
 AKnight = Symbol("A is a Knight")
 AKnave = Symbol("A is a Knave")
@@ -95,8 +96,11 @@ def main():
         if len(knowledge.conjuncts) == 0:
             print("    Not yet implemented.")
         else:
+            # All queries share one knowledge base, so the solver's work
+            # carries over from one symbol to the next
+            knowledge_base = KnowledgeBase(knowledge)
             for symbol in symbols:
-                if model_check(knowledge, symbol):
+                if knowledge_base.ask(symbol):
                     print(f"    {symbol}")
 
 
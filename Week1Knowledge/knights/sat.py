@@ -0,0 +1,468 @@
+import heapq
+
+from logic import *
+
+
+class Encoder():
+    """
+    Translates logical sentences into clauses over integer literals.
+
+    Every symbol is given a positive variable number, and every compound
+    subformula a fresh variable defined to be equivalent to it (Tseitin
+    encoding). Definitions are sent to `solver` as soon as they are created
+    and each subformula is only ever encoded once.
+    """
+
+    def __init__(self, solver):
+        self.solver = solver
+
+        # Mapping of symbol name to variable, and back
+        self.variables = dict()
+        self.names = dict()
+
+        # Literal standing for each subformula encoded so far
+        self.literals = dict()
+
+        # Variable that is always true, used for empty And and Or
+        self.true = self.solver.new_variable()
+        self.solver.add_clause([self.true])
+
+    def variable(self, name):
+        """Returns the variable for a symbol name, creating it if needed."""
+        if name not in self.variables:
+            variable = self.solver.new_variable()
+            self.variables[name] = variable
+            self.names[variable] = name
+        return self.variables[name]
+
+    def literal(self, sentence):
+        """Returns a literal equivalent to `sentence`."""
+        if sentence in self.literals:
+            return self.literals[sentence]
+
+        if isinstance(sentence, Symbol):
+            literal = self.variable(sentence.name)
+        elif isinstance(sentence, Not):
+            literal = -self.literal(sentence.operand)
+        elif isinstance(sentence, And):
+            literal = self.define_and(
+                [self.literal(conjunct) for conjunct in sentence.conjuncts]
+            )
+        elif isinstance(sentence, Or):
+            literal = -self.define_and(
+                [-self.literal(disjunct) for disjunct in sentence.disjuncts]
+            )
+        elif isinstance(sentence, Implication):
+            literal = -self.define_and([
+                self.literal(sentence.antecedent),
+                -self.literal(sentence.consequent)
+            ])
+        elif isinstance(sentence, Biconditional):
+            literal = self.define_equivalence(
+                self.literal(sentence.left), self.literal(sentence.right)
+            )
+        else:
+            raise TypeError("must be a logical sentence")
+
+        self.literals[sentence] = literal
+        return literal
+
+    def define_and(self, literals):
+        """Returns a new variable equivalent to the conjunction of literals."""
+        if not literals:
+            return self.true
+        if len(literals) == 1:
+            return literals[0]
+        x = self.solver.new_variable()
+        for literal in literals:
+            self.solver.add_clause([-x, literal])
+        self.solver.add_clause([x] + [-literal for literal in literals])
+        return x
+
+    def define_equivalence(self, a, b):
+        """Returns a new variable that is true exactly when a equals b."""
+        x = self.solver.new_variable()
+        self.solver.add_clause([-x, -a, b])
+        self.solver.add_clause([-x, a, -b])
+        self.solver.add_clause([x, a, b])
+        self.solver.add_clause([x, -a, -b])
+        return x
+
+    def assertion(self, sentence):
+        """Returns clauses that hold exactly when `sentence` is true."""
+        if isinstance(sentence, And):
+            return [
+                clause for conjunct in sentence.conjuncts
+                for clause in self.assertion(conjunct)
+            ]
+        if isinstance(sentence, Or):
+            return [[self.literal(disjunct)
+                     for disjunct in sentence.disjuncts]]
+        return [[self.literal(sentence)]]
+
+    def model(self, assignment):
+        """Returns the truth value of every symbol in a solver assignment."""
+        return {
+            name: assignment[variable]
+            for name, variable in self.variables.items()
+        }
+
+
+class Solver():
+    """
+    Incremental conflict-driven clause learning SAT solver.
+
+    Clauses are lists of non-zero integers, where -v is the negation of
+    variable v. Clauses may be added between calls to `solve`, and learned
+    clauses and facts derived at the top level are kept from one call to
+    the next. Temporary facts are passed to `solve` as assumptions.
+    """
+
+    # Decay applied to variable activities after every conflict
+    DECAY = 0.95
+
+    # Conflicts allowed before the first restart, and growth per restart
+    RESTART = 100
+    RESTART_GROWTH = 1.5
+
+    def __init__(self):
+        self.clauses = []
+
+        # Clause indices watched by each literal
+        self.watches = dict()
+
+        # Per variable state, indexed by variable number
+        self.values = [None]
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.phases = [False]
+
+        # Assigned literals in order, and where each decision level starts
+        self.trail = []
+        self.limits = []
+        self.head = 0
+
+        # Priority queue of variables to branch on, by activity
+        self.queue = []
+        self.increment = 1.0
+
+        self.unsatisfiable = False
+        self.model = None
+
+    def new_variable(self):
+        """Adds a new variable and returns its number."""
+        variable = len(self.values)
+        self.values.append(None)
+        self.levels.append(0)
+        self.reasons.append(None)
+        self.activity.append(0.0)
+        self.phases.append(False)
+        self.watches[variable] = []
+        self.watches[-variable] = []
+        heapq.heappush(self.queue, (0.0, variable))
+        return variable
+
+    def value(self, literal):
+        """Returns the truth value of a literal, or None if unassigned."""
+        value = self.values[abs(literal)]
+        if value is None:
+            return None
+        return value == (literal > 0)
+
+    def add_clause(self, clause):
+        """Adds a clause that must hold in every model."""
+        self.backtrack(0)
+        if self.unsatisfiable:
+            return
+
+        # Drop duplicates and literals already false, skip satisfied clauses
+        literals = []
+        for literal in clause:
+            value = self.value(literal)
+            if value is True or -literal in literals:
+                return
+            if value is None and literal not in literals:
+                literals.append(literal)
+
+        if not literals:
+            self.unsatisfiable = True
+        elif len(literals) == 1:
+            self.assign(literals[0], None)
+            if self.propagate() is not None:
+                self.unsatisfiable = True
+        else:
+            self.attach(literals)
+
+    def attach(self, literals):
+        """Stores a clause, watching its first two literals."""
+        index = len(self.clauses)
+        self.clauses.append(literals)
+        self.watches[literals[0]].append(index)
+        self.watches[literals[1]].append(index)
+        return index
+
+    def assign(self, literal, reason):
+        """Makes a literal true at the current decision level."""
+        variable = abs(literal)
+        self.values[variable] = literal > 0
+        self.levels[variable] = len(self.limits)
+        self.reasons[variable] = reason
+        self.trail.append(literal)
+
+    def propagate(self):
+        """
+        Assigns every literal implied by unit clauses.
+        Returns the index of a conflicting clause, or None.
+        """
+        while self.head < len(self.trail):
+            false = -self.trail[self.head]
+            self.head += 1
+            watchers = self.watches[false]
+            kept = []
+            for position, index in enumerate(watchers):
+                clause = self.clauses[index]
+
+                # Make sure the false literal is the second watch
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], clause[0]
+                if self.value(clause[0]) is True:
+                    kept.append(index)
+                    continue
+
+                # Look for another literal to watch
+                for k in range(2, len(clause)):
+                    if self.value(clause[k]) is not False:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches[clause[1]].append(index)
+                        break
+                else:
+                    kept.append(index)
+                    if self.value(clause[0]) is False:
+                        kept.extend(watchers[position + 1:])
+                        self.watches[false] = kept
+                        return index
+                    self.assign(clause[0], index)
+            self.watches[false] = kept
+        return None
+
+    def analyze(self, conflict):
+        """
+        Derives a learned clause from a conflict (first unique implication
+        point). Returns the clause and the level to backtrack to.
+        """
+        level = len(self.limits)
+        learned = [None]
+        seen = set()
+        pending = 0
+        literal = None
+        position = len(self.trail) - 1
+        clause = self.clauses[conflict]
+
+        while True:
+            for other in clause:
+                if other == literal:
+                    continue
+                variable = abs(other)
+                if variable in seen or self.levels[variable] == 0:
+                    continue
+                seen.add(variable)
+                self.bump(variable)
+                if self.levels[variable] == level:
+                    pending += 1
+                else:
+                    learned.append(other)
+
+            # Walk back along the trail to the next literal involved
+            while abs(self.trail[position]) not in seen:
+                position -= 1
+            literal = self.trail[position]
+            position -= 1
+            pending -= 1
+            if pending == 0:
+                break
+            clause = self.clauses[self.reasons[abs(literal)]]
+
+        learned[0] = -literal
+        if len(learned) == 1:
+            return learned, 0
+
+        # Watch the literal from the highest remaining level second
+        highest = max(range(1, len(learned)),
+                      key=lambda i: self.levels[abs(learned[i])])
+        learned[1], learned[highest] = learned[highest], learned[1]
+        return learned, self.levels[abs(learned[1])]
+
+    def bump(self, variable):
+        """Increases the activity of a variable involved in a conflict."""
+        self.activity[variable] += self.increment
+        if self.activity[variable] > 1e100:
+            self.activity = [activity * 1e-100 for activity in self.activity]
+            self.increment *= 1e-100
+            self.queue = [
+                (-self.activity[v], v) for v in range(1, len(self.values))
+                if self.values[v] is None
+            ]
+            heapq.heapify(self.queue)
+        elif self.values[variable] is None:
+            heapq.heappush(self.queue, (-self.activity[variable], variable))
+
+    def backtrack(self, level):
+        """Undoes every assignment above a decision level."""
+        if len(self.limits) <= level:
+            return
+        for literal in self.trail[self.limits[level]:]:
+            variable = abs(literal)
+            self.phases[variable] = self.values[variable]
+            self.values[variable] = None
+            self.reasons[variable] = None
+            heapq.heappush(self.queue, (-self.activity[variable], variable))
+        del self.trail[self.limits[level]:]
+        del self.limits[level:]
+        self.head = len(self.trail)
+
+    def decide(self):
+        """Returns the unassigned variable with the highest activity."""
+        while self.queue:
+            activity, variable = heapq.heappop(self.queue)
+            if (self.values[variable] is None
+                    and -activity == self.activity[variable]):
+                return variable
+        for variable in range(1, len(self.values)):
+            if self.values[variable] is None:
+                return variable
+        return None
+
+    def solve(self, assumptions=()):
+        """
+        Checks if all clauses can hold at once with every assumption true.
+        On success, the satisfying assignment is stored in `self.model`.
+        """
+        self.model = None
+        self.backtrack(0)
+        if self.unsatisfiable or self.propagate() is not None:
+            self.unsatisfiable = True
+            return False
+
+        assumptions = list(assumptions)
+        conflicts = 0
+        restart = self.RESTART
+
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if not self.limits:
+                    self.unsatisfiable = True
+                    return False
+                learned, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learned) == 1:
+                    self.assign(learned[0], None)
+                else:
+                    self.assign(learned[0], self.attach(learned))
+                self.increment /= self.DECAY
+
+                # Restart from the top, keeping what was learned
+                conflicts += 1
+                if conflicts >= restart:
+                    conflicts = 0
+                    restart *= self.RESTART_GROWTH
+                    self.backtrack(0)
+                continue
+
+            # Assumptions are decided first, one per decision level
+            if len(self.limits) < len(assumptions):
+                literal = assumptions[len(self.limits)]
+                value = self.value(literal)
+                if value is False:
+                    self.backtrack(0)
+                    return False
+                self.limits.append(len(self.trail))
+                if value is None:
+                    self.assign(literal, None)
+                continue
+
+            variable = self.decide()
+            if variable is None:
+                self.model = list(self.values)
+                self.backtrack(0)
+                return True
+            self.limits.append(len(self.trail))
+            self.assign(variable if self.phases[variable] else -variable,
+                        None)
+
+
+class KnowledgeBase():
+    """
+    Knowledge base that can be told and retracted sentences over time.
+
+    Each told sentence is guarded by its own selector variable, so that
+    retracting it just switches the selector off. The solver and its learned
+    clauses are kept between queries, and answers are cached until the
+    knowledge base changes.
+    """
+
+    def __init__(self, *sentences):
+        self.solver = Solver()
+        self.encoder = Encoder(self.solver)
+
+        # Selector variable for each sentence currently known
+        self.selectors = dict()
+
+        # Answers and models found since the last change
+        self.answers = dict()
+        self.models = []
+
+        for sentence in sentences:
+            self.tell(sentence)
+
+    def tell(self, sentence):
+        """Adds a sentence to the knowledge base."""
+        Sentence.validate(sentence)
+        if sentence in self.selectors:
+            return
+        selector = self.solver.new_variable()
+        for clause in self.encoder.assertion(sentence):
+            self.solver.add_clause(clause + [-selector])
+        self.selectors[sentence] = selector
+        self.answers.clear()
+        self.models.clear()
+
+    def retract(self, sentence):
+        """Removes a previously told sentence from the knowledge base."""
+        if sentence not in self.selectors:
+            raise Exception("sentence not in knowledge base")
+        self.solver.add_clause([-self.selectors.pop(sentence)])
+        self.answers.clear()
+
+    def consistent(self):
+        """Checks if the knowledge base has at least one model."""
+        return self.satisfiable([])
+
+    def ask(self, query):
+        """Checks if the knowledge base entails query."""
+        Sentence.validate(query)
+        if query in self.answers:
+            return self.answers[query]
+
+        # A model of the knowledge base where query is false settles it
+        if any(self.falsifies(model, query) for model in self.models):
+            entailed = False
+        else:
+            entailed = not self.satisfiable([-self.encoder.literal(query)])
+        self.answers[query] = entailed
+        return entailed
+
+    def satisfiable(self, assumptions):
+        """Solves with every known sentence switched on."""
+        if self.solver.solve(list(self.selectors.values()) + assumptions):
+            self.models.append(self.encoder.model(self.solver.model))
+            return True
+        return False
+
+    def falsifies(self, model, query):
+        """Checks if query is known to be false in a stored model."""
+        try:
+            return not query.evaluate(model)
+        except Exception:
+            return False
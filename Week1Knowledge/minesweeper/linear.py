@@ -0,0 +1,131 @@
+from fractions import Fraction
+
+
+class LinearSystem():
+    """
+    Minesweeper sentences as a system of linear equations over the cells,
+    kept in reduced row echelon form as sentences arrive.
+
+    Each equation says that its cells, weighted by their coefficients, hold
+    `total` mines. Since a cell holds either 0 or 1 mines, an equation whose
+    total is the smallest or largest value its left side can take forces
+    every one of its cells. Elimination combines several overlapping
+    sentences into such equations where comparing two at a time finds none.
+
+    Equations are stored sparsely, by their pivot cell, along with the
+    pivots of the equations mentioning each cell, so adding a sentence or
+    assigning a cell only touches the equations that share a cell with it.
+    """
+
+    def __init__(self):
+
+        # Equation with each pivot cell, as ({cell: coefficient}, total)
+        self.rows = dict()
+
+        # Pivots of the equations mentioning each cell
+        self.uses = dict()
+
+        # Pivots of the equations changed since the last deduction
+        self.changed = set()
+
+    def add(self, cells, count):
+        """
+        Adds the equation that `count` of `cells` are mines. Cells must not
+        have been assigned already.
+        """
+        self.insert({cell: Fraction(1) for cell in cells}, Fraction(count))
+
+    def insert(self, equation, total):
+        """
+        Reduces an equation by the existing pivots and, unless nothing is
+        left of it, adds it with a new pivot eliminated from every other
+        equation.
+        """
+
+        # Pivot equations mention no other pivot, so each pivot's
+        # coefficient is unchanged by subtracting the others
+        for pivot in [cell for cell in equation if cell in self.rows]:
+            factor = equation[pivot]
+            row, value = self.rows[pivot]
+            for cell, coefficient in row.items():
+                updated = equation.get(cell, 0) - factor * coefficient
+                if updated:
+                    equation[cell] = updated
+                else:
+                    del equation[cell]
+            total -= factor * value
+        if not equation:
+            return
+
+        # Scale the equation so its pivot has coefficient 1
+        pivot = min(equation)
+        factor = equation[pivot]
+        equation = {cell: coefficient / factor
+                    for cell, coefficient in equation.items()}
+        total /= factor
+
+        # Eliminate the new pivot from the equations that mention it
+        for other in list(self.uses.get(pivot, ())):
+            row, value = self.rows[other]
+            factor = row[pivot]
+            for cell, coefficient in equation.items():
+                updated = row.get(cell, 0) - factor * coefficient
+                if updated:
+                    row[cell] = updated
+                    self.uses.setdefault(cell, set()).add(other)
+                else:
+                    del row[cell]
+                    self.uses[cell].discard(other)
+            self.rows[other] = (row, value - factor * total)
+            self.changed.add(other)
+
+        self.rows[pivot] = (equation, total)
+        for cell in equation:
+            self.uses.setdefault(cell, set()).add(pivot)
+        self.changed.add(pivot)
+
+    def assign(self, cell, mine):
+        """
+        Substitutes a cell known to be a mine (or safe) into every equation
+        mentioning it. An equation that loses its pivot is reinserted.
+        """
+        value = 1 if mine else 0
+        orphan = None
+        for pivot in self.uses.pop(cell, ()):
+            row, total = self.rows[pivot]
+            total -= row.pop(cell) * value
+            if pivot == cell:
+                del self.rows[pivot]
+                for other in row:
+                    self.uses[other].discard(pivot)
+                orphan = (row, total)
+            else:
+                self.rows[pivot] = (row, total)
+                self.changed.add(pivot)
+        if orphan is not None:
+            self.insert(*orphan)
+
+    def deduce(self):
+        """
+        Checks the bounds of every equation changed since the last call.
+        Returns the sets of cells forced to be safe and to be mines.
+        """
+        safes = set()
+        mines = set()
+        for pivot in self.changed:
+            if pivot not in self.rows:
+                continue
+            row, total = self.rows[pivot]
+            lowest = sum(c for c in row.values() if c < 0)
+            highest = sum(c for c in row.values() if c > 0)
+
+            # At the lowest total, every positive cell is safe and every
+            # negative cell a mine, and the other way around at the highest
+            if total == lowest:
+                for cell, coefficient in row.items():
+                    (safes if coefficient > 0 else mines).add(cell)
+            elif total == highest:
+                for cell, coefficient in row.items():
+                    (mines if coefficient > 0 else safes).add(cell)
+        self.changed.clear()
+        return safes, mines
@@ -1,6 +1,76 @@
+import collections
 import itertools
 import random
 
+import numpy as np
+
+from linear import LinearSystem
+from probability import MineProbabilities
+
+
+class CellSet():
+    """
+    Set of cells on a board, stored as a boolean NumPy mask with one
+    entry per cell, so that membership tests take constant time and no
+    tuple is allocated per cell. Iterating yields (i, j) tuples, and it
+    compares equal to a set holding the same cells.
+    """
+
+    def __init__(self, height, width, cells=()):
+        self.mask = np.zeros((height, width), dtype=bool)
+        self.size = 0
+        for cell in cells:
+            self.add(cell)
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Returns the set of cells that are True in a boolean mask."""
+        cells = cls(*mask.shape)
+        cells.mask = mask.astype(bool)
+        cells.size = int(np.count_nonzero(cells.mask))
+        return cells
+
+    def add(self, cell):
+        if not self.mask[cell]:
+            self.mask[cell] = True
+            self.size += 1
+
+    def discard(self, cell):
+        if self.mask[cell]:
+            self.mask[cell] = False
+            self.size -= 1
+
+    def remove(self, cell):
+        if not self.mask[cell]:
+            raise KeyError(cell)
+        self.discard(cell)
+
+    def copy(self):
+        return CellSet.from_mask(self.mask.copy())
+
+    def __contains__(self, cell):
+        return bool(self.mask[cell])
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        width = self.mask.shape[1]
+        for index in np.flatnonzero(self.mask).tolist():
+            yield divmod(index, width)
+
+    def __eq__(self, other):
+        if isinstance(other, CellSet):
+            return np.array_equal(self.mask, other.mask)
+        if isinstance(other, (set, frozenset)):
+            return self.size == len(other) and all(
+                cell in self for cell in other
+            )
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CellSet({set(self)})"
+
 
 class Minesweeper():
     """
@@ -12,26 +82,20 @@ class Minesweeper():
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
 
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        # Initialize a field as a boolean array, and add mines randomly
+        self.board = np.zeros((height, width), dtype=bool)
+        self.board.flat[random.sample(range(height * width), mines)] = True
+        self.mines = CellSet.from_mask(self.board)
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Count the mines around every cell at once: sum each 3x3 window
+        # of the zero-padded board and leave out the cell itself
+        padded = np.pad(self.board.astype(np.uint8), 1)
+        windows = np.lib.stride_tricks.sliding_window_view(padded, (3, 3))
+        self.counts = windows.sum(axis=(2, 3), dtype=np.uint8) - self.board
 
         # At first, player has found no mines
-        self.mines_found = set()
+        self.mines_found = CellSet(height, width)
 
     def print(self):
         """
@@ -49,8 +113,7 @@ class Minesweeper():
         print("--" * self.width + "-")
 
     def is_mine(self, cell):
-        i, j = cell
-        return self.board[i][j]
+        return bool(self.board[cell])
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +121,7 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        return int(self.counts[cell])
 
     def won(self):
         """
@@ -158,21 +204,52 @@ class MinesweeperAI():
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=None, deduction="subsets"):
 
-        # Set initial height and width
+        # Set initial height and width, and the number of mines if known
         self.height = height
         self.width = width
+        self.total_mines = mines
 
         # Keep track of which cells have been clicked on
-        self.moves_made = set()
+        self.moves_made = CellSet(height, width)
 
         # Keep track of cells known to be safe or mines
-        self.mines = set()
-        self.safes = set()
+        self.mines = CellSet(height, width)
+        self.safes = CellSet(height, width)
+
+        # Safe cells that have not been clicked on yet
+        self.safe_moves = set()
+
+        # Sentences about the game known to be true, by id
+        self.sentences = dict()
+        self.next_id = 0
+
+        # Ids of the sentences mentioning each cell, and the id of the
+        # sentence for each set of cells, so that no set is stored twice
+        self.index = dict()
+        self.lookup = dict()
+
+        # Sentences that changed and must be checked for new inferences
+        self.pending = collections.deque()
+        self.queued = set()
+
+        # Estimates mine probabilities when no move is known to be safe
+        self.probabilities = MineProbabilities()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # With "linear" deduction, the sentences observed on the board are
+        # also solved together by elimination, which finds cells that
+        # comparing sentences two at a time misses
+        if deduction not in ("subsets", "linear"):
+            raise ValueError(f"unknown deduction mode {deduction}")
+        self.linear = LinearSystem() if deduction == "linear" else None
+
+    @property
+    def knowledge(self):
+        """
+        List of sentences about the game known to be true.
+        """
+        return list(self.sentences.values())
 
     def mark_mine(self, cell):
         """
@@ -180,8 +257,14 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        self.safe_moves.discard(cell)
+        if self.linear is not None:
+            self.linear.assign(cell, True)
+        for sentence_id in self.index.pop(cell, ()):
+            sentence = self.sentences[sentence_id]
+            del self.lookup[frozenset(sentence.cells)]
             sentence.mark_mine(cell)
+            self.update_sentence(sentence_id)
 
     def mark_safe(self, cell):
         """
@@ -189,8 +272,94 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        if cell not in self.moves_made:
+            self.safe_moves.add(cell)
+        if self.linear is not None:
+            self.linear.assign(cell, False)
+        for sentence_id in self.index.pop(cell, ()):
+            sentence = self.sentences[sentence_id]
+            del self.lookup[frozenset(sentence.cells)]
             sentence.mark_safe(cell)
+            self.update_sentence(sentence_id)
+
+    def add_sentence(self, cells, count):
+        """
+        Adds a sentence to the knowledge base, unless a sentence about
+        the same cells is already known, and queues it for inference.
+        """
+        cells = frozenset(cells)
+        if not cells or cells in self.lookup:
+            return
+        sentence_id = self.next_id
+        self.next_id += 1
+        self.sentences[sentence_id] = Sentence(cells, count)
+        self.lookup[cells] = sentence_id
+        for cell in cells:
+            self.index.setdefault(cell, set()).add(sentence_id)
+        self.queue(sentence_id)
+
+    def update_sentence(self, sentence_id):
+        """
+        Re-files a sentence after one of its cells was marked, dropping it
+        if it became empty or now duplicates another sentence.
+        """
+        sentence = self.sentences[sentence_id]
+        cells = frozenset(sentence.cells)
+        if cells and cells not in self.lookup:
+            self.lookup[cells] = sentence_id
+            self.queue(sentence_id)
+            return
+        del self.sentences[sentence_id]
+        for cell in cells:
+            self.index[cell].discard(sentence_id)
+
+    def queue(self, sentence_id):
+        """
+        Schedules a sentence to be checked for new inferences.
+        """
+        if sentence_id not in self.queued:
+            self.queued.add(sentence_id)
+            self.pending.append(sentence_id)
+
+    def infer(self):
+        """
+        Draws conclusions from queued sentences until nothing new follows.
+        Marking a cell only revisits the sentences that mention it, and
+        subset inference only compares sentences that share a cell.
+        """
+        while self.pending:
+            sentence_id = self.pending.popleft()
+            self.queued.discard(sentence_id)
+            sentence = self.sentences.get(sentence_id)
+            if sentence is None:
+                continue
+
+            # Cells in the sentence may all be safe or all be mines
+            safes = sentence.known_safes()
+            mines = sentence.known_mines()
+            if safes:
+                for cell in list(safes):
+                    self.mark_safe(cell)
+                continue
+            if mines:
+                for cell in list(mines):
+                    self.mark_mine(cell)
+                continue
+
+            # If a sentence's cells are a subset of another's, the cells
+            # left over hold the difference of their counts
+            related = set()
+            for cell in sentence.cells:
+                related.update(self.index[cell])
+            related.discard(sentence_id)
+            for other_id in related:
+                other = self.sentences[other_id]
+                if sentence.cells < other.cells:
+                    self.add_sentence(other.cells - sentence.cells,
+                                      other.count - sentence.count)
+                elif other.cells < sentence.cells:
+                    self.add_sentence(sentence.cells - other.cells,
+                                      sentence.count - other.count)
 
     def add_knowledge(self, cell, count):
         """
@@ -208,60 +377,50 @@ class MinesweeperAI():
                if they can be inferred from existing knowledge
         """
 
-        set_of_cells_for_sentence = set()
-
-        safe = set()
-        mine = set()
-
         #1)
         self.moves_made.add(cell)
+        self.safe_moves.discard(cell)
 
         #2)
         self.mark_safe(cell)
 
         #3) We need to look at the cells that sorround the cell, remember that
         # cell is a tuple (i, j) where i is the row and j is the column.
-        for neighbors_row in range(cell[0] - 1, cell[0] + 2):
-            for neighbors_column in range(cell[1] - 1, cell[1] + 2):
-                # We need to check if it's a valid cell, not a move that has been made,
-                # if it's not a mine and if it's not the cell itself.
-                if ((neighbors_row, neighbors_column) != cell and 
-                    (neighbors_row, neighbors_column) not in self.moves_made and
-                    (neighbors_row, neighbors_column) not in self.mines and 
-                    0 <= neighbors_row < self.height and 0 <= neighbors_column < self.width):
-                    set_of_cells_for_sentence.add((neighbors_row, neighbors_column))
-                else:
-                    if ((neighbors_row, neighbors_column) in self.mines):
-                        count -= 1
-                    else:
-                        continue
-
-        self.knowledge.append(Sentence(set_of_cells_for_sentence, count))
-
-        #4)
-        for sentence in self.knowledge:
-            safe = sentence.known_safes()
-            mine = sentence.known_mines()
-            
-            if (len(safe) != 0):
-               for cell in safe.copy():
-                   self.mark_safe(cell)
-            if (len(mine) != 0):
-               for cell in mine.copy():
-                   self.mark_mine(cell)
-
-        #5)
-        for sentence in self.knowledge:
-            # We check if the new sentence is a subset of one of the sentences 
-            # in the knowledge base. If the count is 0 we can't deduce new sentences.
-            if (Sentence(set_of_cells_for_sentence, count).cells.issubset(sentence.cells)
-                and sentence.count > 0 and count > 0 and Sentence(set_of_cells_for_sentence, count) 
-                != sentence):
-                copy_sentence_cells = sentence.cells.copy()
-                copy_sentence_count = sentence.count
-                Sentence(copy_sentence_cells - Sentence(set_of_cells_for_sentence, count).cells, 
-                         copy_sentence_count - count)
-
+        # Cells already known to be safe are left out, and known mines are
+        # left out and taken off the count.
+        cells = set()
+        for i in range(max(cell[0] - 1, 0), min(cell[0] + 2, self.height)):
+            for j in range(max(cell[1] - 1, 0), min(cell[1] + 2, self.width)):
+                if (i, j) in self.mines:
+                    count -= 1
+                elif (i, j) not in self.safes:
+                    cells.add((i, j))
+        if self.linear is not None and cells:
+            self.linear.add(cells, count)
+        self.add_sentence(cells, count)
+
+        #4) and 5) Only sentences touched by this move are revisited, until
+        # no more cells can be marked and no more sentences inferred.
+        self.infer()
+        if self.linear is not None:
+            self.deduce()
+
+    def deduce(self):
+        """
+        Marks the cells forced by the linear system, along with everything
+        that follows from them, until elimination finds nothing new.
+        """
+        while True:
+            safes, mines = self.linear.deduce()
+            safes = [cell for cell in safes if cell not in self.safes]
+            mines = [cell for cell in mines if cell not in self.mines]
+            if not safes and not mines:
+                return
+            for cell in safes:
+                self.mark_safe(cell)
+            for cell in mines:
+                self.mark_mine(cell)
+            self.infer()
 
     def make_safe_move(self):
         """
@@ -272,11 +431,8 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        for move in self.safes:
-            #If there is a move that we know for sure it's safe and not made
-            if move and move not in self.moves_made and move not in self.mines:
-                move_chosen = move
-                return move_chosen
+        for move in self.safe_moves:
+            return move
         return None
 
     def make_random_move(self):
@@ -285,24 +441,40 @@ class MinesweeperAI():
         Should choose randomly among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+
+        Rather than choosing uniformly, we pick the cell least likely to
+        be a mine given everything known, breaking ties randomly.
         """
-        possible_moves = []
-        print(f"{self.safes}")
-
-        # Check which cells fulfill the condition,
-        #  we check the conditions first for efficiency.
-        for row in range(self.height):
-            for column in range(self.width):
-                if ((row, column) not in self.moves_made and 
-                    (row, column) not in self.mines):
-                    possible_moves.append((row, column))
-        
-        # If there are cells that fulfill the condition, choose one randomly,
-        # if not, return none.
-        if len(possible_moves) != 0:
-            return random.choice(possible_moves)
-        else:
+        unknown = ~(self.moves_made.mask | self.mines.mask)
+        if not unknown.any():
             return None
 
-
-        
+        # Cells mentioned by some sentence get their own probability, the
+        # rest share the probability of an unconstrained cell.
+        frontier = [cell for cell, ids in self.index.items()
+                    if ids and unknown[cell]]
+        unconstrained = unknown.copy()
+        for cell in frontier:
+            unconstrained[cell] = False
+        others = int(np.count_nonzero(unconstrained))
+        mines_left = (None if self.total_mines is None
+                      else self.total_mines - len(self.mines))
+        probabilities, other_probability = self.probabilities.solve(
+            self.sentences.values(), others, mines_left
+        )
+
+        # Choose uniformly among the least likely cells, counting the
+        # unconstrained cells only if they are among them
+        lowest = min(
+            [probabilities[cell] for cell in frontier]
+            + ([other_probability] if others else [])
+        )
+        best = [cell for cell in frontier
+                if probabilities[cell] <= lowest + 1e-9]
+        if not others or other_probability > lowest + 1e-9:
+            return random.choice(best)
+        choice = random.randrange(len(best) + others)
+        if choice < len(best):
+            return best[choice]
+        index = np.flatnonzero(unconstrained)[choice - len(best)]
+        return divmod(int(index), self.width)
@@ -0,0 +1,289 @@
+import math
+
+# Largest group of linked cells whose mine layouts are enumerated exactly.
+# Larger groups get a cheaper per-sentence estimate instead.
+MAX_COMPONENT = 40
+
+# Most component results remembered between moves
+CACHE_SIZE = 1024
+
+
+class MineProbabilities():
+    """
+    Estimates how likely each unknown cell is to hold a mine.
+
+    Cells mentioned by the AI's sentences (the frontier) are split into
+    components that share no sentence. The mine layouts consistent with
+    each component's sentences are enumerated and counted by number of
+    mines, then the components are combined, weighting each total by the
+    number of ways to place the remaining mines among the other cells.
+    Component results are cached, since most of the frontier stays the
+    same from one move to the next.
+    """
+
+    def __init__(self):
+        self.cache = dict()
+
+    def solve(self, sentences, others, mines_left=None):
+        """
+        Returns a dictionary from frontier cell to mine probability, and
+        the mine probability of each of the `others` unknown cells that no
+        sentence mentions. `mines_left` is the number of mines not yet
+        found, if known.
+        """
+        probabilities = dict()
+        tables = []
+        frontier = []
+        expected = 0
+        for constraints in components(sentences):
+            cells = {cell for cell_set, _ in constraints for cell in cell_set}
+            if len(cells) > MAX_COMPONENT:
+                estimate = estimate_component(constraints)
+                probabilities.update(estimate)
+                expected += sum(estimate.values())
+            else:
+                tables.append(self.component(constraints))
+                frontier.append(cells)
+
+        # Mines left over once large components take their expected share
+        if mines_left is not None:
+            mines_left = max(0, round(mines_left - expected))
+
+        # Scale each table to a distribution, so that products of many
+        # components stay within the range of a float
+        tables = [normalize(table) for table in tables]
+
+        # Distribution of frontier mines over all exactly solved components
+        # and over all but each one, from prefix and suffix convolutions
+        prefixes = [{0: 1.0}]
+        for table in tables:
+            prefixes.append(convolve([prefixes[-1], table]))
+        suffixes = [{0: 1.0}]
+        for table in reversed(tables):
+            suffixes.append(convolve([suffixes[-1], table]))
+        suffixes.reverse()
+        totals = [convolve([prefixes[i], suffixes[i + 1]])
+                  for i in range(len(tables))]
+        everything = prefixes[-1]
+
+        # Ways to place the remaining mines on unconstrained cells, kept as
+        # logarithms relative to the largest, since the counts themselves
+        # can have hundreds of thousands of digits on large boards
+        def log_ways(frontier_mines):
+            rest = mines_left - frontier_mines
+            if rest < 0 or rest > others:
+                return None
+            return (math.lgamma(others + 1) - math.lgamma(rest + 1)
+                    - math.lgamma(others - rest + 1))
+
+        logs = dict()
+        if mines_left is not None:
+            for mines in everything:
+                logs[mines] = log_ways(mines)
+        top = max((value for value in logs.values() if value is not None),
+                  default=0)
+
+        def weight(frontier_mines):
+            """Relative ways to place the rest of the mines."""
+            if mines_left is None:
+                return 1
+            value = logs.get(frontier_mines)
+            if value is None:
+                return 0
+            return math.exp(value - top)
+
+        normalizer = sum(
+            ways * weight(mines) for mines, ways in everything.items()
+        )
+        if normalizer == 0:
+            normalizer = 1
+
+        for table, rest, cells in zip(tables, totals, frontier):
+            for mines, (ways, cell_ways) in table.items():
+                factor = sum(
+                    count * weight(mines + other)
+                    for other, count in rest.items()
+                )
+                for cell, count in cell_ways.items():
+                    probabilities[cell] = (
+                        probabilities.get(cell, 0)
+                        + count * factor / normalizer
+                    )
+            for cell in cells:
+                probabilities.setdefault(cell, 0.0)
+
+        # Chance that any one unconstrained cell holds a mine
+        if not others:
+            other_probability = 0.0
+        elif mines_left is None:
+            other_probability = (
+                sum(probabilities.values()) / len(probabilities)
+                if probabilities else 0.5
+            )
+        else:
+            other_probability = sum(
+                ways * weight(mines) * (mines_left - mines)
+                for mines, ways in everything.items()
+            ) / normalizer / others
+
+        return probabilities, other_probability
+
+    def component(self, constraints):
+        """
+        Returns, for each possible number of mines in a component, how many
+        layouts have that many mines and how many of those put a mine on
+        each cell. Results are cached by the component's sentences.
+        """
+        key = frozenset(constraints)
+        if key not in self.cache:
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.clear()
+            self.cache[key] = enumerate_layouts(constraints)
+        return self.cache[key]
+
+
+def components(sentences):
+    """
+    Groups (cells, count) constraints into components linked by shared cells.
+    """
+    parent = dict()
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    constraints = []
+    for sentence in sentences:
+        cells = frozenset(sentence.cells)
+        if not cells:
+            continue
+        constraints.append((cells, sentence.count))
+        for cell in cells:
+            parent.setdefault(cell, cell)
+        first = find(next(iter(cells)))
+        for cell in cells:
+            parent[find(cell)] = first
+
+    groups = dict()
+    for constraint in constraints:
+        root = find(next(iter(constraint[0])))
+        groups.setdefault(root, []).append(constraint)
+    return list(groups.values())
+
+
+def enumerate_layouts(constraints):
+    """
+    Backtracks over every mine layout consistent with the constraints.
+    Returns {mines: (layouts, {cell: layouts with a mine on cell})}.
+    """
+
+    # Visit cells constraint by constraint in breadth-first order from the
+    # smallest one, so that constraints close as early as possible
+    by_cell = dict()
+    for index, (cells, _) in enumerate(constraints):
+        for cell in cells:
+            by_cell.setdefault(cell, []).append(index)
+    start = min(range(len(constraints)), key=lambda i: len(constraints[i][0]))
+    queue = [start]
+    visited = {start}
+    order = []
+    position = dict()
+    for index in queue:
+        for cell in sorted(constraints[index][0]):
+            if cell in position:
+                continue
+            position[cell] = len(order)
+            order.append(cell)
+            for other in by_cell[cell]:
+                if other not in visited:
+                    visited.add(other)
+                    queue.append(other)
+
+    # For each constraint, mines still needed and cells still unassigned
+    need = [count for _, count in constraints]
+    left = [len(cells) for cells, _ in constraints]
+    touching = [[] for _ in order]
+    for index, (cells, _) in enumerate(constraints):
+        for cell in cells:
+            touching[position[cell]].append(index)
+
+    table = dict()
+    mined = []
+
+    def search(i):
+        if i == len(order):
+            ways, cell_ways = table.get(len(mined), (0, dict()))
+            for cell in mined:
+                cell_ways[cell] = cell_ways.get(cell, 0) + 1
+            table[len(mined)] = (ways + 1, cell_ways)
+            return
+        constraints_here = touching[i]
+
+        # Try the cell as a mine
+        if all(need[c] > 0 for c in constraints_here):
+            for c in constraints_here:
+                need[c] -= 1
+                left[c] -= 1
+            mined.append(order[i])
+            search(i + 1)
+            mined.pop()
+            for c in constraints_here:
+                need[c] += 1
+                left[c] += 1
+
+        # Try the cell as safe
+        if all(need[c] < left[c] for c in constraints_here):
+            for c in constraints_here:
+                left[c] -= 1
+            search(i + 1)
+            for c in constraints_here:
+                left[c] += 1
+
+    search(0)
+    return table
+
+
+def estimate_component(constraints):
+    """
+    Estimates mine probabilities in a component too large to enumerate,
+    taking for each cell the highest density among its sentences.
+    """
+    estimate = dict()
+    for cells, count in constraints:
+        density = count / len(cells)
+        for cell in cells:
+            estimate[cell] = max(estimate.get(cell, 0.0), density)
+    return estimate
+
+
+def normalize(table):
+    """
+    Divides the counts in a component table by its total number of layouts.
+    """
+    total = sum(ways for ways, _ in table.values()) or 1
+    return {
+        mines: (ways / total,
+                {cell: count / total for cell, count in cell_ways.items()})
+        for mines, (ways, cell_ways) in table.items()
+    }
+
+
+def convolve(tables):
+    """
+    Returns how many combined layouts have each total number of mines.
+    Tables may be component tables or totals returned by convolve.
+    """
+    totals = {0: 1}
+    for table in tables:
+        combined = dict()
+        for mines, count in totals.items():
+            for more, ways in table.items():
+                if isinstance(ways, tuple):
+                    ways = ways[0]
+                combined[mines + more] = (
+                    combined.get(mines + more, 0) + count * ways
+                )
+        totals = combined
+    return totals
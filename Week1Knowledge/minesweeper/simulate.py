@@ -0,0 +1,138 @@
+import multiprocessing
+import random
+import sys
+import time
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+HEIGHT = 8
+WIDTH = 8
+MINES = 8
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) not in [2, 5, 6, 7, 8]:
+        sys.exit(
+            "Usage: python simulate.py games [height width mines "
+            "[processes [seed [subsets|linear]]]]"
+        )
+    games = int(sys.argv[1])
+    height, width, mines = HEIGHT, WIDTH, MINES
+    if len(sys.argv) >= 5:
+        height, width, mines = map(int, sys.argv[2:5])
+    processes = int(sys.argv[5]) if len(sys.argv) >= 6 else None
+    seed = int(sys.argv[6]) if len(sys.argv) >= 7 else 0
+    deduction = sys.argv[7] if len(sys.argv) >= 8 else "subsets"
+    if not 0 <= mines < height * width:
+        sys.exit("Number of mines must leave at least one safe cell.")
+
+    results = simulate(games, height, width, mines, processes, seed,
+                       deduction)
+    print(f"Board: {height}x{width} with {mines} mines, {games} games")
+    report(results)
+
+
+def play(height, width, mines, seed, deduction="subsets"):
+    """
+    Plays one game of Minesweeper with the AI, seeding the random number
+    generator so the same seed always gives the same board and moves.
+
+    Returns a dictionary with whether the AI won, the number of moves
+    made, and the time spent choosing moves and adding knowledge.
+    """
+    random.seed(seed)
+    game = Minesweeper(height=height, width=width, mines=mines)
+    ai = MinesweeperAI(height=height, width=width, mines=mines,
+                       deduction=deduction)
+
+    moves = 0
+    move_time = 0
+    knowledge_time = 0
+    won = False
+    while True:
+
+        # Make a safe move if one is known, otherwise a random one
+        start = time.perf_counter()
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+        move_time += time.perf_counter() - start
+
+        # With no moves left, every mine has been flagged
+        if move is None:
+            won = ai.mines == game.mines
+            break
+        if game.is_mine(move):
+            break
+
+        moves += 1
+        start = time.perf_counter()
+        ai.add_knowledge(move, game.nearby_mines(move))
+        knowledge_time += time.perf_counter() - start
+
+        # Revealing every safe cell also wins the game
+        if moves == height * width - mines:
+            won = True
+            break
+
+    return {
+        "won": won,
+        "moves": moves,
+        "move_time": move_time,
+        "knowledge_time": knowledge_time
+    }
+
+
+def play_game(arguments):
+    """Unpacks arguments for play, for use with a process pool."""
+    return play(*arguments)
+
+
+def simulate(games, height=HEIGHT, width=WIDTH, mines=MINES,
+             processes=None, seed=0, deduction="subsets"):
+    """
+    Plays `games` games in parallel across `processes` processes (one per
+    CPU by default), game i using seed `seed + i` and the AI using the
+    given deduction mode. Returns a list of the results of each game, in
+    order, plus the total elapsed time.
+    """
+    tasks = [(height, width, mines, seed + i, deduction)
+             for i in range(games)]
+    start = time.perf_counter()
+    if processes == 1:
+        results = [play_game(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(play_game, tasks, chunksize=max(
+                1, games // (4 * (processes or multiprocessing.cpu_count()))
+            ))
+    return results, time.perf_counter() - start
+
+
+def report(simulation):
+    """
+    Prints win rate, moves per second and average time per add_knowledge.
+    """
+    results, elapsed = simulation
+    games = len(results)
+    wins = sum(result["won"] for result in results)
+    moves = sum(result["moves"] for result in results)
+    knowledge_time = sum(result["knowledge_time"] for result in results)
+    thinking = knowledge_time + sum(result["move_time"] for result in results)
+
+    # Standard error of the win rate, to judge whether a change matters
+    rate = wins / games if games else 0
+    error = (rate * (1 - rate) / games) ** 0.5 if games else 0
+    print(f"Win rate: {rate:.1%} ± {error:.1%} ({wins}/{games})")
+    print(f"Moves per second: {moves / thinking if thinking else 0:,.0f}")
+    print(
+        "Average add_knowledge time: "
+        f"{knowledge_time / moves * 1000 if moves else 0:.3f} ms"
+    )
+    print(f"Elapsed time: {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
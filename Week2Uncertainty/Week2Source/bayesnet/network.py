@@ -0,0 +1,321 @@
+import itertools
+import random
+
+import numpy as np
+
+# Most entries in a factor kept by a query plan, with one axis for each
+# evidence variable; larger queries substitute the evidence values first
+MAX_PLAN_SIZE = 1 << 20
+
+
+class DiscreteDistribution():
+    """
+    Distribution over the values of a variable with no parents, given as a
+    dictionary from value to probability.
+    """
+
+    def __init__(self, probabilities):
+        self.parameters = [dict(probabilities)]
+        self.parents = []
+        self.values = list(probabilities)
+
+    def table(self):
+        """Returns the probabilities as an array, in order of `values`."""
+        return np.array([self.parameters[0][value] for value in self.values])
+
+    def sample(self, parent_values=None):
+        """Returns a value drawn at random from the distribution."""
+        return random.choices(self.values,
+                              weights=list(self.parameters[0].values()))[0]
+
+
+class ConditionalProbabilityTable():
+    """
+    Distribution over the values of a variable given the values of its
+    parents. Each row lists a value of every parent, in the order of
+    `parents`, then a value of the variable and its probability.
+    """
+
+    def __init__(self, rows, parents):
+        self.rows = [list(row) for row in rows]
+        self.parents = list(parents)
+        self.values = list(dict.fromkeys(row[-2] for row in self.rows))
+
+    def table(self):
+        """
+        Returns the probabilities as an array with an axis for each parent,
+        then one for the variable, each in order of their `values`.
+        """
+        table = np.zeros([len(parent.values) for parent in self.parents]
+                         + [len(self.values)])
+        for *keys, value, p in self.rows:
+            index = tuple(parent.values.index(key)
+                          for parent, key in zip(self.parents, keys))
+            table[index + (self.values.index(value),)] = p
+        return table
+
+    def sample(self, parent_values):
+        """
+        Returns a value drawn at random given `parent_values`, a dictionary
+        from each parent distribution to its value.
+        """
+        keys = [parent_values[parent] for parent in self.parents]
+        rows = [row for row in self.rows if row[:-2] == keys]
+        return random.choices([row[-2] for row in rows],
+                              weights=[row[-1] for row in rows])[0]
+
+
+class Node():
+    """A variable of a Bayesian network, with its distribution and name."""
+
+    def __init__(self, distribution, name):
+        self.distribution = distribution
+        self.name = name
+
+
+class Factor():
+    """
+    Table of non-negative numbers with one axis for each variable in
+    `variables`, given by their positions in the network.
+    """
+
+    def __init__(self, variables, table):
+        self.variables = tuple(variables)
+        self.table = table
+
+
+class BayesianNetwork():
+    """
+    Bayesian network over discrete variables, answering queries by
+    variable elimination on NumPy factor tables.
+
+    Answers are exact. pomegranate's predict_proba used approximate
+    (loopy) belief propagation, so inference.py now prints slightly
+    different numbers than it did with pomegranate: given a delayed train,
+    no rain is 0.4601 rather than 0.4583. Likelihoods from probability,
+    as in likelihood.py, were exact before and are unchanged.
+
+    Queries are compiled into plans that depend only on which variables
+    are observed, not on their values. A plan keeps the evidence variables
+    as axes of its factor while every other variable is summed out, so
+    later queries with the same variables observed only index into it.
+    Elimination orders are cached the same way.
+    """
+
+    def __init__(self):
+        self.states = []
+        self.edges = []
+
+        # Factors over the kept variables, and elimination orders, by the
+        # variables each was computed for
+        self.plans = dict()
+        self.orders = dict()
+
+    def add_states(self, *states):
+        """Adds nodes to the network."""
+        self.states.extend(states)
+
+    def add_edge(self, a, b):
+        """Adds an edge from node `a` to node `b`, a child of `a`."""
+        self.edges.append((a, b))
+
+    def bake(self):
+        """
+        Finalizes the network once every node and edge has been added,
+        checking that the edges into each node match the parents of its
+        distribution, and building its factor tables.
+        """
+        position = {state.distribution: i
+                    for i, state in enumerate(self.states)}
+        self.factors = []
+        for i, state in enumerate(self.states):
+            parents = [position[parent]
+                       for parent in state.distribution.parents]
+            edges = [position[a.distribution]
+                     for a, b in self.edges if b is state]
+            if sorted(parents) != sorted(edges):
+                raise ValueError(
+                    f"edges into {state.name} do not match the parents "
+                    "of its distribution"
+                )
+            self.factors.append(Factor(parents + [i],
+                                       state.distribution.table()))
+        self.index = {state.name: i for i, state in enumerate(self.states)}
+        self.values = [{value: j for j, value
+                        in enumerate(state.distribution.values)}
+                       for state in self.states]
+        self.plans.clear()
+        self.orders.clear()
+
+    def code(self, variable, value):
+        """Returns the position of `value` among a variable's values."""
+        try:
+            return self.values[variable][value]
+        except KeyError:
+            raise ValueError(f"{value!r} is not a value of "
+                             f"{self.states[variable].name}") from None
+
+    def probability(self, rows):
+        """
+        Returns the probability of each row of values, one for each node in
+        order, as an array, or as a single number given a single row. A
+        value of None is unknown, and is summed over.
+
+        Fully observed rows are scored all at once, by looking up every
+        row's entry in each table. Rows with unknown values are grouped by
+        which values are known, each group indexing into one plan.
+        """
+        rows = list(rows)
+        codes = np.zeros((len(rows), len(self.states)), dtype=np.int64)
+        known = np.ones((len(rows), len(self.states)), dtype=bool)
+        for r, row in enumerate(rows):
+            for variable, value in enumerate(row):
+                if value is None:
+                    known[r, variable] = False
+                else:
+                    codes[r, variable] = self.code(variable, value)
+
+        result = np.ones(len(rows))
+        complete = known.all(axis=1)
+        for factor in self.factors:
+            result[complete] *= factor.table[
+                tuple(codes[complete, variable]
+                      for variable in factor.variables)
+            ]
+
+        for pattern in np.unique(known[~complete], axis=0):
+            group = np.flatnonzero((known == pattern).all(axis=1))
+            observed = tuple(np.flatnonzero(pattern).tolist())
+            if size(self, observed) <= MAX_PLAN_SIZE:
+                plan = self.plan(observed)
+                result[group] = plan.table[
+                    tuple(codes[group, variable] for variable in observed)
+                ]
+            else:
+                for r in group:
+                    evidence = {v: codes[r, v] for v in observed}
+                    result[r] = self.eliminate(evidence, ()).table
+        return result if len(rows) != 1 else float(result[0])
+
+    def predict_proba(self, evidence):
+        """
+        Returns, for each node in order, its observed value if `evidence`
+        (a dictionary from node name to value) has one, and otherwise its
+        distribution given the evidence.
+        """
+        observed = {self.index[name]: self.code(self.index[name], value)
+                    for name, value in evidence.items()}
+        given = tuple(sorted(observed))
+        predictions = []
+        for variable, state in enumerate(self.states):
+            if variable in observed:
+                predictions.append(evidence[state.name])
+                continue
+
+            # Index into the plan for these variables, if it fits
+            keep = given + (variable,)
+            if size(self, keep) <= MAX_PLAN_SIZE:
+                table = self.plan(keep).table[
+                    tuple(observed[v] for v in given)
+                ]
+            else:
+                table = self.eliminate(observed, (variable,)).table
+            total = table.sum()
+            if total == 0:
+                raise ValueError("evidence has probability 0")
+            predictions.append(DiscreteDistribution(
+                dict(zip(state.distribution.values, (table / total).tolist()))
+            ))
+        return predictions
+
+    def plan(self, keep):
+        """
+        Returns the factor over the variables in `keep`, in that order, with
+        every other variable summed out, computing it on first use.
+        """
+        if keep not in self.plans:
+            self.plans[keep] = self.eliminate({}, keep)
+        return self.plans[keep]
+
+    def eliminate(self, evidence, keep):
+        """
+        Returns the factor over `keep` after substituting the values of the
+        variables in `evidence` (a dictionary from variable to value code)
+        and summing out every other variable, in a cached min-fill order.
+        """
+        factors = []
+        for factor in self.factors:
+            index = tuple(evidence.get(variable, slice(None))
+                          for variable in factor.variables)
+            factors.append(Factor(
+                [v for v in factor.variables if v not in evidence],
+                factor.table[index]
+            ))
+        key = (tuple(keep), tuple(sorted(evidence)))
+        if key not in self.orders:
+            self.orders[key] = elimination_order(factors, keep)
+        for variable in self.orders[key]:
+            related = [f for f in factors if variable in f.variables]
+            factors = [f for f in factors if variable not in f.variables]
+            variables = sorted(
+                set().union(*(f.variables for f in related)) - {variable}
+            )
+            factors.append(combine(related, variables))
+        return combine(factors, keep)
+
+
+def size(network, variables):
+    """Returns the number of entries in a factor over `variables`."""
+    total = 1
+    for variable in variables:
+        total *= len(network.values[variable])
+    return total
+
+
+def combine(factors, variables):
+    """
+    Multiplies factors together and sums out every variable not in
+    `variables`, returning a factor over `variables`.
+    """
+    labels = dict()
+    operands = []
+    for factor in factors:
+        operands.append(factor.table)
+        operands.append([labels.setdefault(variable, len(labels))
+                         for variable in factor.variables])
+    operands.append([labels[variable] for variable in variables])
+    return Factor(variables, np.einsum(*operands))
+
+
+def elimination_order(factors, keep):
+    """
+    Returns an order to sum out every variable of `factors` not in `keep`,
+    chosen greedily: next is the variable whose elimination adds the
+    fewest new edges between its neighbors, with ties going to the fewest
+    neighbors.
+    """
+    neighbors = dict()
+    for factor in factors:
+        for variable in factor.variables:
+            neighbors.setdefault(variable, set()).update(factor.variables)
+            neighbors[variable].discard(variable)
+
+    def fill(variable):
+        return sum(
+            1 for a, b in itertools.combinations(neighbors[variable], 2)
+            if b not in neighbors[a]
+        )
+
+    order = []
+    remaining = set(neighbors) - set(keep)
+    while remaining:
+        variable = min(remaining,
+                       key=lambda v: (fill(v), len(neighbors[v]), v))
+        for a, b in itertools.combinations(neighbors[variable], 2):
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+        for neighbor in neighbors.pop(variable):
+            neighbors[neighbor].discard(variable)
+        remaining.discard(variable)
+        order.append(variable)
+    return order
@@ -1,7 +1,6 @@
-import pomegranate
-
 from collections import Counter
 
+import network
 from model import model
 
 def generate_sample():
@@ -16,7 +15,7 @@ def generate_sample():
     for state in model.states:
 
         # If we have a non-root node, sample conditional on parents
-        if isinstance(state.distribution, pomegranate.ConditionalProbabilityTable):
+        if isinstance(state.distribution, network.ConditionalProbabilityTable):
             sample[state.name] = state.distribution.sample(parent_values=parents)
 
         # Otherwise, just sample from the distribution alone
@@ -0,0 +1,201 @@
+import concurrent.futures
+import csv
+import glob
+import hashlib
+import os
+import sys
+
+import heredity
+
+# Columns of the output file, with one row for each person in each family
+FIELDS = ["file", "hash", "engine", "person",
+          "gene_2", "gene_1", "gene_0", "trait"]
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [3, 4, 5]:
+        sys.exit("Usage: python batch.py (directory|pattern) output.csv "
+                 f"[{'|'.join(heredity.ENGINES)} [processes]]")
+    engine = sys.argv[3] if len(sys.argv) >= 4 else "elimination"
+    if engine not in heredity.ENGINES:
+        sys.exit(f"Unknown engine {engine}, "
+                 f"choose from {', '.join(heredity.ENGINES)}")
+    processes = int(sys.argv[4]) if len(sys.argv) == 5 else None
+    paths = family_files(sys.argv[1], exclude=sys.argv[2])
+    if not paths:
+        sys.exit(f"No family files found in {sys.argv[1]}")
+
+    people, counts, failed = run_batch(paths, sys.argv[2], engine, processes)
+    for path, error in failed.items():
+        print(f"Skipped {path}: {error}", file=sys.stderr)
+    print(f"Wrote {people} people from {len(paths) - len(failed)} families "
+          f"to {sys.argv[2]}")
+    print(f"Computed {counts['computed']} families, "
+          f"reused {counts['reused']} unchanged ones, "
+          f"copied {counts['duplicate']} duplicate files")
+    if failed:
+        print(f"Skipped {len(failed)} families that failed")
+
+
+def family_files(pattern, exclude=None):
+    """
+    Returns the sorted paths of the CSV files in a directory, or of the
+    files matching a glob pattern such as data/family*.csv, leaving out
+    `exclude` (the output file, which may sit among the families).
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.csv")
+    excluded = os.path.abspath(exclude) if exclude is not None else None
+    return sorted(
+        path for path in glob.glob(pattern)
+        if os.path.isfile(path) and os.path.abspath(path) != excluded
+    )
+
+
+def content_hash(path):
+    """
+    Returns the SHA-256 digest of a file's contents, as hex.
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def infer_family(arguments):
+    """
+    Loads one family file and runs the named engine on it, for use with a
+    process pool. Returns a list of (person, probabilities) and None, or
+    None and a description of the error if the family could not be done,
+    so that one bad file does not stop the others.
+    """
+    path, engine = arguments
+    try:
+        people = heredity.load_data(path)
+        probabilities = heredity.ENGINES[engine](people)
+        return [(person, probabilities[person]) for person in people], None
+    except Exception as error:
+        return None, f"{type(error).__name__}: {error}"
+
+
+def load_rows(output):
+    """
+    Returns the rows of a previous output file, or nothing if there is no
+    usable previous output.
+    """
+    try:
+        with open(output, newline="") as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames != FIELDS:
+                return []
+            return list(reader)
+    except FileNotFoundError:
+        return []
+
+
+def load_cache(rows):
+    """
+    Returns output rows grouped by the hash of the family file and the
+    engine they came from. Files with the same contents have the same
+    rows, so only the first file with each hash is kept.
+    """
+    cache = dict()
+    first = dict()
+    for row in rows:
+        key = (row["hash"], row["engine"])
+        if first.setdefault(key, row["file"]) == row["file"]:
+            cache.setdefault(key, []).append(row)
+    return cache
+
+
+def run_batch(paths, output, engine="elimination", processes=None):
+    """
+    Runs inference on every family file across a pool of processes (one
+    per CPU by default), and writes every person's marginals to a single
+    CSV file at `output`.
+
+    Results are keyed by the hash of each family file's contents, so on
+    later runs into the same output, families whose files have not changed
+    are copied over instead of computed again, as are files with the same
+    contents as another. Rows from other engines are kept as they were,
+    so one output can hold results from several engines.
+
+    Families that fail (a malformed file, or one too tangled for the
+    engine) are skipped, and the rest are still written. Returns the
+    number of people written for this engine, a count of the files that
+    were computed, reused from the previous output or copied from a file
+    with the same contents, and a dictionary from each skipped file to
+    its error.
+    """
+    previous = load_rows(output)
+    cache = load_cache(previous)
+    hashes = [content_hash(path) for path in paths]
+
+    # One file for each new set of contents
+    pending = dict()
+    for path, digest in zip(paths, hashes):
+        if (digest, engine) not in cache:
+            pending.setdefault(digest, path)
+    tasks = [(path, engine) for path in pending.values()]
+    if processes == 1 or len(tasks) <= 1:
+        results = [infer_family(task) for task in tasks]
+    else:
+        workers = processes or os.cpu_count()
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(
+                infer_family, tasks,
+                chunksize=max(1, len(tasks) // (workers * 4))
+            ))
+    errors = dict()
+    for digest, (result, error) in zip(pending, results):
+        if error is not None:
+            errors[digest] = error
+            continue
+        cache[(digest, engine)] = [
+            {
+                "person": person,
+                "gene_2": repr(probabilities["gene"][2]),
+                "gene_1": repr(probabilities["gene"][1]),
+                "gene_0": repr(probabilities["gene"][0]),
+                "trait": repr(probabilities["trait"][True])
+            }
+            for person, probabilities in result
+        ]
+
+    # Tell apart files computed now, reused from the previous output, or
+    # with the same contents as an earlier file
+    counts = {"computed": 0, "reused": 0, "duplicate": 0}
+    failed = dict()
+    seen = set()
+    for path, digest in zip(paths, hashes):
+        if digest in errors:
+            failed[path] = errors[digest]
+        elif digest in seen:
+            counts["duplicate"] += 1
+        elif digest in pending:
+            counts["computed"] += 1
+        else:
+            counts["reused"] += 1
+        seen.add(digest)
+
+    # Write to a temporary file first, so an interrupted run leaves the
+    # previous output, and with it the cache, in place
+    written = 0
+    temporary = output + ".tmp"
+    with open(temporary, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for path, digest in zip(paths, hashes):
+            if digest in errors:
+                continue
+            for row in cache[(digest, engine)]:
+                writer.writerow({**row, "file": path, "hash": digest,
+                                 "engine": engine})
+                written += 1
+        writer.writerows(row for row in previous if row["engine"] != engine)
+    os.replace(temporary, output)
+    return written, counts, failed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import itertools
+
+import numpy as np
+
+# Most people in one clique of the junction tree, whose tables have 3 **
+# MAX_CLIQUE entries; more tangled pedigrees need approximate inference
+MAX_CLIQUE = 14
+
+
+class Factor():
+    """
+    Table of non-negative numbers over some people's gene counts, with one
+    axis of length 3 (for 0, 1 or 2 copies) per person in `variables`.
+    """
+
+    def __init__(self, variables, table):
+        self.variables = tuple(variables)
+        self.table = table
+
+
+def combine(factors, variables):
+    """
+    Multiplies factors together and sums out every person not in
+    `variables`, returning a factor over `variables` scaled to sum to 1.
+    Scaling keeps long products from underflowing, and does not change
+    the marginals, which are normalized in the end anyway. People in
+    `variables` that no factor mentions get a uniform table.
+    """
+    labels = dict()
+    operands = []
+    for factor in factors:
+        operands.append(factor.table)
+        operands.append([labels.setdefault(variable, len(labels))
+                         for variable in factor.variables])
+    missing = [variable for variable in variables if variable not in labels]
+    if missing:
+        operands.append(np.ones((3,) * len(missing)))
+        operands.append([labels.setdefault(variable, len(labels))
+                         for variable in missing])
+    operands.append([labels[variable] for variable in variables])
+    table = np.einsum(*operands)
+    total = table.sum()
+    return Factor(variables, table / total if total > 0 else table)
+
+
+def passing(genes, probs):
+    """
+    Returns the probability that a parent with `genes` copies of the gene
+    passes one on to their child, or 1 for a parent who is not known,
+    as in heredity.joint_probability.
+    """
+    if genes is None:
+        return 1
+    return {
+        0: probs["mutation"],
+        1: 0.5,
+        2: 1 - probs["mutation"]
+    }[genes]
+
+
+def person_factors(people, probs):
+    """
+    Returns the factors of the Bayesian network over gene counts: each
+    person's gene count given their parents' (or unconditionally), times
+    the probability of their trait if it is observed.
+    """
+    factors = []
+    for person in people:
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        parents = [parent for parent in (mother, father) if parent is not None]
+
+        # Probability of each gene count given the parents' gene counts
+        if not parents:
+            table = np.array([probs["gene"][genes] for genes in range(3)])
+        else:
+            table = np.zeros((3,) * (len(parents) + 1))
+            for genes in itertools.product(range(3), repeat=len(parents)):
+                known = iter(genes)
+                pm = passing(next(known) if mother is not None else None,
+                             probs)
+                pf = passing(next(known) if father is not None else None,
+                             probs)
+                table[genes] = [
+                    (1 - pm) * (1 - pf),
+                    pm * (1 - pf) + pf * (1 - pm),
+                    pm * pf
+                ]
+
+        # An observed trait is evidence about the person's gene count
+        trait = people[person]["trait"]
+        if trait is not None:
+            table = table * np.array(
+                [probs["trait"][genes][trait] for genes in range(3)]
+            )
+        factors.append(Factor(parents + [person], table))
+    return factors
+
+
+def elimination_order(factors):
+    """
+    Returns an order to eliminate people in, chosen greedily: next is the
+    person whose elimination adds the fewest new edges between their
+    neighbors (min-fill), with ties going to the fewest neighbors.
+    Also returns each person's neighbors at the time of elimination.
+    """
+    neighbors = dict()
+    for factor in factors:
+        for variable in factor.variables:
+            neighbors.setdefault(variable, set()).update(factor.variables)
+            neighbors[variable].discard(variable)
+
+    def fill(variable):
+        return sum(
+            1 for a, b in itertools.combinations(neighbors[variable], 2)
+            if b not in neighbors[a]
+        )
+
+    order = []
+    cliques = dict()
+    while neighbors:
+        variable = min(neighbors,
+                       key=lambda v: (fill(v), len(neighbors[v]), v))
+        cliques[variable] = set(neighbors[variable])
+        for a, b in itertools.combinations(neighbors[variable], 2):
+            neighbors[a].add(b)
+            neighbors[b].add(a)
+        for neighbor in neighbors.pop(variable):
+            neighbors[neighbor].discard(variable)
+        order.append(variable)
+    return order, cliques
+
+
+def gene_marginals(people, probs):
+    """
+    Returns each person's distribution over gene counts given the observed
+    traits, by message passing on a junction tree.
+
+    The tree has a clique for each person, holding them and their
+    neighbors when eliminated in min-fill order, and linked to the clique
+    of whichever of those neighbors is eliminated first. Messages are sent
+    up the tree in elimination order and back down in reverse, which
+    yields every person's marginal for about twice the cost of a single
+    variable elimination: polynomial in the number of people, and
+    exponential only in the size of the largest clique (the treewidth).
+    """
+    factors = person_factors(people, probs)
+    order, separators = elimination_order(factors)
+    largest = max((len(separator) + 1 for separator in separators.values()),
+                  default=0)
+    if largest > MAX_CLIQUE:
+        raise ValueError(
+            f"pedigree has a clique of {largest} people, "
+            f"more than MAX_CLIQUE ({MAX_CLIQUE}) for exact inference"
+        )
+    position = {variable: i for i, variable in enumerate(order)}
+    parent = {
+        variable: min(separators[variable], key=position.get, default=None)
+        for variable in order
+    }
+    children = {variable: [] for variable in order}
+    for variable in order:
+        if parent[variable] is not None:
+            children[parent[variable]].append(variable)
+
+    # Each factor goes to the clique of the first of its people eliminated
+    assigned = {variable: [] for variable in order}
+    for factor in factors:
+        first = min(factor.variables, key=position.get)
+        assigned[first].append(factor)
+
+    # Messages from each clique up to its parent, in elimination order
+    up = dict()
+    for variable in order:
+        incoming = assigned[variable] + [up[child]
+                                         for child in children[variable]]
+        separator = tuple(sorted(separators[variable]))
+        up[variable] = combine(incoming, separator)
+
+    # Messages from each clique down to its children, in reverse order
+    down = dict()
+    marginals = dict()
+    for variable in reversed(order):
+        incoming = assigned[variable] + [up[child]
+                                         for child in children[variable]]
+        if parent[variable] is not None:
+            incoming.append(down[variable])
+        marginals[variable] = combine(incoming, (variable,)).table
+        for child in children[variable]:
+            others = [factor for factor in incoming if factor is not up[child]]
+            down[child] = combine(others, tuple(sorted(separators[child])))
+    return marginals
+
+
+def infer(people, probs):
+    """
+    Returns the same gene and trait distributions for each person as
+    heredity.py's enumeration of every joint assignment.
+    """
+    marginals = gene_marginals(people, probs)
+    probabilities = dict()
+    for person in people:
+        genes = marginals[person]
+        trait = people[person]["trait"]
+        if trait is None:
+            has_trait = sum(genes[count] * probs["trait"][count][True]
+                            for count in range(3))
+        else:
+            has_trait = 1.0 if trait else 0.0
+        probabilities[person] = {
+            "gene": {count: float(genes[count]) for count in (2, 1, 0)},
+            "trait": {True: float(has_trait), False: float(1 - has_trait)}
+        }
+    return probabilities
@@ -1,4 +1,5 @@
 import csv
+import importlib
 import itertools
 import sys
 
@@ -40,9 +41,34 @@ PROBS = {
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    if len(sys.argv) not in [2, 3]:
+        sys.exit(
+            f"Usage: python heredity.py data.csv [{'|'.join(ENGINES)}]"
+        )
     people = load_data(sys.argv[1])
+    engine = sys.argv[2] if len(sys.argv) == 3 else "enumeration"
+    if engine not in ENGINES:
+        sys.exit(f"Unknown engine {engine}, choose from {', '.join(ENGINES)}")
+
+    # Compute gene and trait probabilities for each person
+    probabilities = ENGINES[engine](people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def enumerate_joint(people):
+    """
+    Return the gene and trait probabilities for each person, by summing
+    the joint probability of every assignment of genes and traits that
+    agrees with the known traits.
+    """
 
     # Keep track of gene and trait probabilities for each person
     probabilities = {
@@ -60,39 +86,29 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
-
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+    # Only people whose trait is unknown vary; the rest are fixed by the
+    # evidence, so no assignment that contradicts it is ever generated
+    names = list(people)
+    known = {person for person in names if people[person]["trait"]}
+    unknown = [person for person in names if people[person]["trait"] is None]
+    everyone = (1 << len(names)) - 1
+    for trait_mask in submasks((1 << len(unknown)) - 1):
+        have_trait = known | members(trait_mask, unknown)
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
+        # Loop over all sets of people who might have the gene, with those
+        # who have two copies a subset of those who do not have one
+        for one_mask in submasks(everyone):
+            one_gene = members(one_mask, names)
+            for two_mask in submasks(everyone & ~one_mask):
+                two_genes = members(two_mask, names)
 
                 # Update probabilities with new joint probability
                 p = joint_probability(people, one_gene, two_genes, have_trait)
                 update(probabilities, one_gene, two_genes, have_trait, p)
-                
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
-
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+    return probabilities
 
 
 def load_data(filename):
@@ -128,6 +144,31 @@ def powerset(s):
         )
     ]
 
+def submasks(mask):
+    """
+    Generate every subset of the bits set in `mask`, one at a time, from
+    `mask` itself down to 0, without storing any of them.
+    """
+    subset = mask
+    while True:
+        yield subset
+        if subset == 0:
+            return
+        subset = (subset - 1) & mask
+
+
+def members(mask, names):
+    """
+    Return the set of names whose positions are set bits in `mask`.
+    """
+    found = set()
+    while mask:
+        bit = mask & -mask
+        found.add(names[bit.bit_length() - 1])
+        mask ^= bit
+    return found
+
+
 def joint_probability(people, one_gene, two_genes, have_trait):
     """
     Compute and return a joint probability.
@@ -248,5 +289,26 @@ def normalize(probabilities):
             for key in probabilities[person][category]:
                 probabilities[person][category][key] /= total_sum
 
+def numpy_engine(module, *arguments):
+    """
+    Return an engine that runs `module`.infer, importing the module (and
+    with it numpy) only when the engine is used, so that enumeration
+    needs nothing beyond the standard library.
+    """
+    def engine(people):
+        return importlib.import_module(module).infer(people, PROBS, *arguments)
+    return engine
+
+
+# Ways to compute the probabilities, by name
+ENGINES = {
+    "enumeration": enumerate_joint,
+    "vectorized": numpy_engine("vectorized"),
+    "elimination": numpy_engine("elimination"),
+    "likelihood": numpy_engine("sampling", "likelihood"),
+    "gibbs": numpy_engine("sampling", "gibbs"),
+}
+
+
 if __name__ == "__main__":
     main()
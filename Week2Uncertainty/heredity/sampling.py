@@ -0,0 +1,467 @@
+import itertools
+import sys
+
+import numpy as np
+
+from elimination import passing
+
+# Sampling stops once every estimated probability has a standard error
+# below TARGET_ERROR, or after MAX_STEPS steps
+TARGET_ERROR = 0.005
+MAX_STEPS = 20000
+
+# Smallest effective sample size at which standard errors are trusted:
+# with fewer, they come from too few samples to mean anything, as when
+# one likelihood weight outweighs all the others
+MIN_ESS = 400
+
+# Independent chains (or samples per step, for likelihood weighting) run
+# side by side, one row of each array per chain
+CHAINS = 64
+
+# Steps between convergence checks, and Gibbs sweeps discarded at the start
+CHECK_EVERY = 50
+BURN_IN = 100
+
+# Largest R-hat at which Gibbs chains are taken to have mixed
+MAX_RHAT = 1.01
+
+
+def main():
+
+    # Check for proper usage
+    if len(sys.argv) not in [2, 3, 4, 5]:
+        sys.exit("Usage: python sampling.py data.csv "
+                 "[likelihood|gibbs [target_error [seed]]]")
+    from heredity import PROBS, load_data
+    people = load_data(sys.argv[1])
+    method = sys.argv[2] if len(sys.argv) >= 3 else "gibbs"
+    if method not in SAMPLERS:
+        sys.exit(f"Unknown method {method}, choose from {', '.join(SAMPLERS)}")
+    target_error = float(sys.argv[3]) if len(sys.argv) >= 4 else TARGET_ERROR
+    seed = int(sys.argv[4]) if len(sys.argv) >= 5 else None
+
+    probabilities, diagnostics = sample(people, PROBS, method,
+                                        target_error=target_error, seed=seed)
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+    # Print convergence diagnostics
+    print(f"Samples: {diagnostics['samples']:,}")
+    print(f"Largest standard error: {diagnostics['error']:.5f}")
+    print(f"Smallest effective sample size: {diagnostics['ess']:,.0f}")
+    if diagnostics["rhat"] is not None:
+        print(f"Largest R-hat: {diagnostics['rhat']:.4f}")
+    if not diagnostics["converged"]:
+        print(f"Stopped after {MAX_STEPS} steps without reaching the target")
+
+
+class Pedigree():
+    """
+    Gene and trait probabilities of a family as NumPy arrays, over people
+    numbered so that parents come before their children.
+
+    The probability of each of a person's gene counts given their mother's
+    and father's is in column 9 * person + 3 * mother's + father's of
+    `table`, which has a row for each gene count. Parents who are not known
+    are stood in for by an extra person, numbered len(people), whose gene
+    count is always 0 and whose columns are the same as any other. Gene
+    counts come first in every array, since NumPy is slow to reduce over
+    a short last axis.
+    """
+
+    def __init__(self, people, probs):
+
+        # Parents before children, so people can be sampled in order
+        self.names = []
+        placed = set()
+
+        def place(person):
+            if person is None or person in placed:
+                return
+            placed.add(person)
+            place(people[person]["mother"])
+            place(people[person]["father"])
+            self.names.append(person)
+
+        for person in people:
+            place(person)
+        index = {name: i for i, name in enumerate(self.names)}
+        self.size = len(self.names)
+
+        self.mother = np.full(self.size, self.size)
+        self.father = np.full(self.size, self.size)
+        table = np.empty((self.size, 3, 3, 3))
+        self.evidence = np.ones((3, self.size))
+        self.observed = np.zeros(self.size, dtype=bool)
+        for i, name in enumerate(self.names):
+            mother = people[name]["mother"]
+            father = people[name]["father"]
+            if mother is None and father is None:
+                table[i] = [probs["gene"][genes] for genes in range(3)]
+            else:
+                for m, f in itertools.product(range(3), repeat=2):
+                    pm = passing(m if mother is not None else None, probs)
+                    pf = passing(f if father is not None else None, probs)
+                    table[i, m, f] = [
+                        (1 - pm) * (1 - pf),
+                        pm * (1 - pf) + pf * (1 - pm),
+                        pm * pf
+                    ]
+            if mother is not None:
+                self.mother[i] = index[mother]
+            if father is not None:
+                self.father[i] = index[father]
+
+            # An observed trait weighs each gene count by its likelihood
+            trait = people[name]["trait"]
+            if trait is not None:
+                self.observed[i] = True
+                self.evidence[:, i] = [probs["trait"][genes][trait]
+                                       for genes in range(3)]
+        self.has_trait = np.array([probs["trait"][genes][True]
+                                   for genes in range(3)])
+        self.table = np.moveaxis(table, 3, 0).reshape(3, -1)
+        with np.errstate(divide="ignore"):
+            self.log_table = np.log(self.table)
+            self.log_evidence = np.log(self.evidence)
+
+        # People in each generation, counted from those with no parents,
+        # since everyone in a generation can be sampled at once
+        depth = np.zeros(self.size + 1, dtype=int)
+        for i in range(self.size):
+            depth[i] = 1 + max(depth[self.mother[i]], depth[self.father[i]])
+        self.generations = [np.flatnonzero(depth[:self.size] == level)
+                            for level in range(1, depth.max() + 1)]
+
+    def columns(self, genes, people):
+        """
+        Returns the columns of `table` for `people` given the gene counts
+        of their parents in each chain of `genes`.
+        """
+        return (9 * people + 3 * genes[:, self.mother[people]]
+                + genes[:, self.father[people]])
+
+    def forward(self, rng, chains):
+        """
+        Samples gene counts for `chains` families from the prior, ignoring
+        the traits. Returns an array of shape (chains, people + 1), whose
+        last column is the stand-in for unknown parents.
+        """
+        genes = np.zeros((chains, self.size + 1), dtype=np.int64)
+        for people in self.generations:
+            genes[:, people] = draw(rng,
+                                    self.table[:, self.columns(genes, people)])
+        return genes
+
+    def colors(self):
+        """
+        Splits people into groups none of whom share a factor, so that each
+        group can be updated at once by Gibbs sampling: nobody is in a group
+        with their parents, children or the other parents of their children.
+        Returns, for each group, its people, the parent and the child of
+        each link from them to their children, and a matrix from those
+        links to the group's people that sums the links of each parent.
+        """
+        neighbors = [set() for _ in range(self.size)]
+        children = [[] for _ in range(self.size)]
+        for i in range(self.size):
+            parents = [p for p in (self.mother[i], self.father[i])
+                       if p < self.size]
+            for parent in parents:
+                children[parent].append(i)
+                neighbors[parent].add(i)
+                neighbors[i].add(parent)
+            if len(parents) == 2:
+                neighbors[parents[0]].add(parents[1])
+                neighbors[parents[1]].add(parents[0])
+
+        # Greedy coloring, giving each person the first color unused by
+        # their neighbors
+        color = dict()
+        for i in range(self.size):
+            used = {color[n] for n in neighbors[i] if n in color}
+            color[i] = next(c for c in itertools.count() if c not in used)
+
+        groups = []
+        for c in range(max(color.values(), default=-1) + 1):
+            people = np.array([i for i in range(self.size) if color[i] == c])
+            edges = [(position, child) for position, i in enumerate(people)
+                     for child in children[i]]
+            positions = np.array([position for position, _ in edges],
+                                 dtype=np.int64)
+            incidence = np.zeros((len(edges), len(people)))
+            incidence[np.arange(len(edges)), positions] = 1
+            groups.append((people, people[positions],
+                           np.array([child for _, child in edges],
+                                    dtype=np.int64),
+                           incidence))
+        return groups
+
+
+def draw(rng, p):
+    """
+    Samples a gene count from each distribution along the first axis of
+    `p`, which need not sum to 1.
+    """
+    first = p[0]
+    second = first + p[1]
+    u = rng.random(first.shape) * (second + p[2])
+    return (u >= first).astype(np.int64) + (u >= second)
+
+
+def values(pedigree, p):
+    """
+    Returns the quantities estimated from the distributions `p` over each
+    person's gene count: the three probabilities, then the probability of
+    the trait, along the first axis.
+    """
+    return np.concatenate([p, np.tensordot(pedigree.has_trait, p, 1)[None]])
+
+
+def likelihood_weighting(pedigree, rng, chains, target_error):
+    """
+    Samples gene counts from the prior and weighs each sample by the
+    likelihood of the observed traits.
+
+    Samples are independent, so there is no R-hat to check; the effective
+    sample size comes from the spread of the weights. With many observed
+    traits, most weight falls on few samples, and Gibbs sampling does
+    better; the standard errors then look small only because they come
+    from a handful of samples, so the effective sample size must also
+    reach MIN_ESS. Draws `chains` samples per step, CHECK_EVERY steps at once.
+    Returns estimates of shape (4, people) and diagnostics.
+    """
+    shape = (4, pedigree.size)
+    total = 0
+    total_squares = 0
+    sums = np.zeros(shape)
+    weighted_squares = np.zeros(shape)
+    squares = np.zeros(shape)
+    shift = -np.inf
+    rows = np.arange(pedigree.size)
+
+    for step in range(CHECK_EVERY, MAX_STEPS + CHECK_EVERY, CHECK_EVERY):
+        genes = pedigree.forward(rng, chains * CHECK_EVERY)[:, :pedigree.size]
+        log_weights = pedigree.log_evidence[genes, rows].sum(axis=1)
+
+        # Keep weights relative to the largest seen, so they stay in range
+        if log_weights.max() > shift:
+            scale = np.exp(shift - log_weights.max())
+            total *= scale
+            sums *= scale
+            total_squares *= scale ** 2
+            weighted_squares *= scale ** 2
+            squares *= scale ** 2
+            shift = log_weights.max()
+        weights = np.exp(log_weights - shift)
+
+        # Trait probabilities given the genes, rather than sampled traits
+        x = values(pedigree, (genes == np.arange(3)[:, None, None]) * 1.0)
+        total += weights.sum()
+        total_squares += (weights ** 2).sum()
+        sums += weights @ x
+        weighted_squares += weights ** 2 @ x
+        squares += weights ** 2 @ x ** 2
+
+        estimates = sums / total
+        variance = (squares - 2 * estimates * weighted_squares
+                    + estimates ** 2 * total_squares) / total ** 2
+        error = np.sqrt(np.maximum(variance, 0))[~skipped(pedigree)]
+        ess = total ** 2 / total_squares
+        if error.max() < target_error and ess >= MIN_ESS:
+            break
+
+    return estimates, {
+        "samples": step * chains,
+        "error": float(error.max()),
+        "ess": float(ess),
+        "rhat": None,
+        "converged": bool(error.max() < target_error and ess >= MIN_ESS)
+    }
+
+
+def gibbs(pedigree, rng, chains, target_error):
+    """
+    Runs Gibbs sampling over gene counts in `chains` independent chains.
+
+    Each sweep redraws every person's gene count given the rest, one group
+    of people who share no factor at a time. The distributions drawn from
+    are averaged, rather than the draws themselves, which gives the same
+    expectation with less variance. Since chains are independent, the
+    spread of their averages measures the standard error; R-hat compares
+    it with the spread within each chain. Returns estimates of shape
+    (4, people) and diagnostics.
+    """
+    genes = pedigree.forward(rng, chains)
+    groups = pedigree.colors()
+    mother = pedigree.mother
+    father = pedigree.father
+    log_table = pedigree.log_table
+
+    # Each group's sums and sums of squares of its estimates, per chain
+    sums = [np.zeros((4, chains, len(people))) for people, *_ in groups]
+    squares = [np.zeros((4, chains, len(people))) for people, *_ in groups]
+
+    for step in range(1, BURN_IN + MAX_STEPS + 1):
+        for group, (people, parent, child, incidence) in enumerate(groups):
+
+            # Log probability of each gene count of each person in the
+            # group, given their parents and their trait
+            log_p = (log_table[:, pedigree.columns(genes, people)]
+                     + pedigree.log_evidence[:, None, people])
+
+            # Plus, for each count, the log probability of their children's
+            # gene counts, summed over each person's children
+            if len(child):
+                for count in range(3):
+                    m = np.where(mother[child] == parent, count,
+                                 genes[:, mother[child]])
+                    f = np.where(father[child] == parent, count,
+                                 genes[:, father[child]])
+                    log_p[count] += log_table[
+                        genes[:, child], 9 * child + 3 * m + f
+                    ] @ incidence
+
+            p = np.exp(log_p - np.maximum(np.maximum(log_p[0], log_p[1]),
+                                          log_p[2]))
+            p /= p[0] + p[1] + p[2]
+            genes[:, people] = draw(rng, p)
+            if step > BURN_IN:
+                x = values(pedigree, p)
+                sums[group] += x
+                squares[group] += x ** 2
+
+        draws = step - BURN_IN
+        if draws > 1 and (draws % CHECK_EVERY == 0 or draws == MAX_STEPS):
+            error, ess, rhat = chain_diagnostics(
+                gather(groups, sums, pedigree.size),
+                gather(groups, squares, pedigree.size),
+                draws
+            )
+            keep = ~skipped(pedigree)
+            error, ess, rhat = error[keep], ess[keep], rhat[keep]
+            if (error.max() < target_error and ess.min() >= MIN_ESS
+                    and rhat.max() < MAX_RHAT):
+                break
+
+    return gather(groups, sums, pedigree.size).mean(axis=1) / draws, {
+        "samples": draws * chains,
+        "error": float(error.max()),
+        "ess": float(ess.min()),
+        "rhat": float(rhat.max()),
+        "converged": bool(error.max() < target_error
+                          and ess.min() >= MIN_ESS
+                          and rhat.max() < MAX_RHAT)
+    }
+
+
+def gather(groups, arrays, size):
+    """
+    Puts each group's array of shape (4, chains, people in group) into one
+    array of shape (4, chains, size), in the columns of the group's people.
+    """
+    whole = np.empty(arrays[0].shape[:2] + (size,))
+    for (people, *_), array in zip(groups, arrays):
+        whole[:, :, people] = array
+    return whole
+
+
+def chain_diagnostics(sums, squares, draws):
+    """
+    Returns the standard error, effective sample size and R-hat of each
+    estimate, from each chain's sums and sums of squares of `draws` draws,
+    given as arrays of shape (4, chains, people).
+    """
+    chains = sums.shape[1]
+    means = sums / draws
+    within = np.maximum(squares / draws - means ** 2, 0).mean(axis=1)
+    within *= draws / (draws - 1)
+    between = means.var(axis=1, ddof=1)
+    pooled = (draws - 1) / draws * within + between
+    error = np.sqrt(between / chains)
+
+    # Estimates that never change, such as those of people linked to no
+    # one, vary only by rounding error and count as fully converged
+    fixed = pooled <= 1e-12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ess = np.where(fixed | (between <= 0), chains * draws,
+                       pooled / (between / chains))
+        rhat = np.where(fixed | (within <= 0), 1.0, np.sqrt(pooled / within))
+    return error, ess, rhat
+
+
+def skipped(pedigree):
+    """
+    Returns a mask of the estimates that are not checked for convergence:
+    the trait probabilities of people whose trait was observed.
+    """
+    mask = np.zeros((4, pedigree.size), dtype=bool)
+    mask[3] = pedigree.observed
+    return mask
+
+
+# Sampling methods, by name
+SAMPLERS = {
+    "likelihood": likelihood_weighting,
+    "gibbs": gibbs
+}
+
+
+def sample(people, probs, method="gibbs", target_error=TARGET_ERROR,
+           chains=CHAINS, seed=None):
+    """
+    Estimates each person's gene and trait distributions by sampling,
+    until every estimate has a standard error below `target_error` and an
+    effective sample size of at least MIN_ESS.
+    Returns the same dictionary as heredity.py's enumeration, and the
+    convergence diagnostics.
+    """
+    pedigree = Pedigree(people, probs)
+    rng = np.random.default_rng(seed)
+    estimates, diagnostics = SAMPLERS[method](pedigree, rng, chains,
+                                              target_error)
+    probabilities = dict()
+    for i, person in enumerate(pedigree.names):
+        genes = estimates[:3, i] / estimates[:3, i].sum()
+        trait = people[person]["trait"]
+        if trait is None:
+            has_trait = estimates[3, i]
+        else:
+            has_trait = 1.0 if trait else 0.0
+        probabilities[person] = {
+            "gene": {count: float(genes[count]) for count in (2, 1, 0)},
+            "trait": {True: float(has_trait), False: float(1 - has_trait)}
+        }
+    return {person: probabilities[person] for person in people}, diagnostics
+
+
+def infer(people, probs, method="gibbs", target_error=TARGET_ERROR,
+          seed=None):
+    """
+    Returns the estimated gene and trait distributions for each person,
+    warning on stderr if sampling stopped before reaching `target_error`.
+    """
+    probabilities, diagnostics = sample(people, probs, method,
+                                        target_error=target_error, seed=seed)
+    if not diagnostics["converged"]:
+        rhat = diagnostics["rhat"]
+        print(
+            f"Warning: {method} sampling did not converge after "
+            f"{diagnostics['samples']:,} samples (largest standard error "
+            f"{diagnostics['error']:.4f}, effective sample size "
+            f"{diagnostics['ess']:,.0f}"
+            + (f", R-hat {rhat:.3f}" if rhat is not None else "")
+            + "); results may be far off",
+            file=sys.stderr
+        )
+    return probabilities
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Tests the sampling engines against exact inference on the small families,
+and checks that likelihood weighting does not claim to have converged on a
+large pedigree where a few samples carry all the weight.
+"""
+
+import random
+import sys
+
+from heredity import PROBS, load_data
+import elimination
+import sampling
+
+# Largest difference allowed between sampled and exact probabilities
+TOLERANCE = 0.03
+
+
+def largest_difference(people, a, b):
+    """
+    Returns the largest difference between two sets of gene and trait
+    probabilities for the same people.
+    """
+    return max(
+        max(abs(a[person]["gene"][count] - b[person]["gene"][count])
+            for count in (2, 1, 0))
+        for person in people
+    )
+
+
+def large_pedigree(generations=5, founders=28, seed=1):
+    """
+    Returns a pedigree of several generations, in the format of load_data,
+    where couples from each generation have one to three children and
+    people marrying in have no parents. About half of the traits are
+    observed.
+    """
+    rng = random.Random(seed)
+    people = dict()
+
+    def add(mother=None, father=None):
+        name = f"Person{len(people)}"
+        people[name] = {"name": name, "mother": mother, "father": father,
+                        "trait": None}
+        return name
+
+    generation = [add() for _ in range(founders)]
+    for _ in range(generations - 1):
+        rng.shuffle(generation)
+        children = []
+        for mother, father in zip(generation[::2], generation[1::2]):
+            for _ in range(rng.randint(1, 3)):
+                children.append(add(mother, father))
+        generation = children + [add() for _ in range(len(children) // 2)]
+    for person in people.values():
+        if rng.random() < 0.5:
+            person["trait"] = rng.random() < 0.3
+    return people
+
+
+def testing_small_families():
+    for i in range(3):
+        people = load_data(f"data/family{i}.csv")
+        exact = elimination.infer(people, PROBS)
+        for method in sampling.SAMPLERS:
+            probabilities, diagnostics = sampling.sample(people, PROBS,
+                                                         method, seed=0)
+            difference = largest_difference(people, probabilities, exact)
+            print(f"family{i} {method}: converged {diagnostics['converged']}, "
+                  f"largest difference {difference:.4f}")
+            assert diagnostics["converged"]
+            assert difference < TOLERANCE
+
+
+def testing_large_pedigree():
+    people = large_pedigree()
+    results = dict()
+    for method in sampling.SAMPLERS:
+        results[method] = sampling.sample(people, PROBS, method, seed=0)
+        diagnostics = results[method][1]
+        print(f"{len(people)} people {method}: "
+              f"converged {diagnostics['converged']}, "
+              f"samples {diagnostics['samples']:,}, "
+              f"error {diagnostics['error']:.5f}, "
+              f"ESS {diagnostics['ess']:,.0f}")
+
+    # Gibbs sampling mixes here, and likelihood weighting must either
+    # agree with it or say that it did not converge
+    gibbs, diagnostics = results["gibbs"]
+    assert diagnostics["converged"]
+    likelihood, diagnostics = results["likelihood"]
+    difference = largest_difference(people, likelihood, gibbs)
+    print(f"largest difference between engines: {difference:.4f}")
+    if diagnostics["converged"]:
+        assert diagnostics["ess"] >= sampling.MIN_ESS
+        assert difference < TOLERANCE
+
+
+testing_small_families()
+testing_large_pedigree()
+print("All tests passed", file=sys.stderr)
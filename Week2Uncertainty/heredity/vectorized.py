@@ -0,0 +1,62 @@
+import numpy as np
+
+from elimination import person_factors
+
+# Gene assignments evaluated at once, bounding memory to a few arrays of
+# CHUNK_SIZE rows
+CHUNK_SIZE = 1 << 18
+
+
+def infer(people, probs, chunk_size=CHUNK_SIZE):
+    """
+    Returns the same gene and trait distributions for each person as
+    heredity.py's enumeration, computing joint probabilities for many
+    assignments at once with NumPy.
+
+    Gene assignments are numbered 0 to 3^n - 1 and decoded chunk by chunk
+    into an array of shape (assignments, people), whose column for each
+    person holds their gene count in base 3. Each person's factor (their
+    gene count given their parents', times any observed trait) is gathered
+    by fancy indexing, and the factors are multiplied together. Trait
+    assignments need no enumeration of their own: an unknown trait sums to
+    1 over its two values, so its distribution follows from the gene counts.
+    """
+    names = list(people)
+    column = {name: i for i, name in enumerate(names)}
+    factors = person_factors(people, probs)
+    columns = [[column[variable] for variable in factor.variables]
+               for factor in factors]
+    has_trait = np.array([probs["trait"][genes][True] for genes in range(3)])
+    powers = 3 ** np.arange(len(names), dtype=np.int64)
+
+    genes_total = np.zeros((len(names), 3))
+    trait_total = np.zeros(len(names))
+    for start in range(0, 3 ** len(names), chunk_size):
+        numbers = np.arange(start, min(start + chunk_size, 3 ** len(names)),
+                            dtype=np.int64)
+        genes = (numbers[:, None] // powers) % 3
+
+        # Joint probability of each assignment in the chunk
+        p = np.ones(len(numbers))
+        for factor, indices in zip(factors, columns):
+            p *= factor.table[tuple(genes[:, i] for i in indices)]
+
+        # Sum joint probabilities into each person's distributions
+        for i in range(len(names)):
+            genes_total[i] += np.bincount(genes[:, i], weights=p, minlength=3)
+            trait_total[i] += p @ has_trait[genes[:, i]]
+
+    probabilities = dict()
+    for i, person in enumerate(names):
+        total = genes_total[i].sum()
+        observed = people[person]["trait"]
+        if observed is None:
+            trait = trait_total[i] / total
+        else:
+            trait = 1.0 if observed else 0.0
+        probabilities[person] = {
+            "gene": {count: float(genes_total[i][count] / total)
+                     for count in (2, 1, 0)},
+            "trait": {True: float(trait), False: float(1 - trait)}
+        }
+    return probabilities
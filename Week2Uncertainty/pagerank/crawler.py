@@ -0,0 +1,76 @@
+import concurrent.futures
+import mmap
+import os
+import re
+import sys
+
+import numpy as np
+
+from graph import LinkGraph
+
+# Same pattern as pagerank.crawl, compiled once and matched over bytes
+LINK = re.compile(rb"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Files at least this large are memory-mapped instead of read
+MMAP_SIZE = 1 << 20
+
+
+def main():
+    if len(sys.argv) not in [3, 4]:
+        sys.exit("Usage: python crawler.py corpus graph [processes]")
+    processes = int(sys.argv[3]) if len(sys.argv) == 4 else None
+    graph = crawl_graph(sys.argv[1], processes)
+    graph.save(sys.argv[2])
+    print(f"Saved {graph.size} pages and {graph.links()} links "
+          f"to {sys.argv[2]}")
+
+
+def extract_links(path):
+    """
+    Returns the set of hrefs of the links in one HTML file.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size >= MMAP_SIZE:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                links = set(LINK.findall(data))
+        else:
+            links = set(LINK.findall(f.read()))
+    return {link.decode("utf-8", "replace") for link in links}
+
+
+def crawl_graph(directory, processes=None):
+    """
+    Parses a directory of HTML pages across a pool of processes (one per
+    CPU by default), and returns the LinkGraph of links between pages in
+    the corpus, as pagerank.crawl would find them.
+    """
+    pages = sorted(
+        entry.name for entry in os.scandir(directory)
+        if entry.name.endswith(".html")
+    )
+    paths = [os.path.join(directory, page) for page in pages]
+    if processes == 1:
+        found = [extract_links(path) for path in paths]
+    else:
+        workers = processes or os.cpu_count()
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            found = list(executor.map(
+                extract_links, paths,
+                chunksize=max(1, len(paths) // (workers * 4))
+            ))
+
+    # Only include links to other pages in the corpus
+    index = {page: i for i, page in enumerate(pages)}
+    sources = []
+    targets = []
+    for source, links in enumerate(found):
+        links = sorted(index[link] for link in links if link in index)
+        targets.extend(target for target in links if target != source)
+        sources.extend([source] * (len(targets) - len(sources)))
+
+    return LinkGraph(pages, np.array(sources, dtype=np.int64),
+                     np.array(targets, dtype=np.int64))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class LinkGraph():
+    """
+    Link graph of a corpus, stored as arrays of page numbers so that a
+    PageRank step is a handful of vectorized operations over the links.
+
+    Links are sorted by target page, in compressed sparse row form: the
+    links into page i come from pages sources[indptr[i]:indptr[i + 1]].
+    Pages with no outgoing links (dangling pages) are not given links to
+    every page; PageRank spreads their rank evenly as a separate term.
+    """
+
+    def __init__(self, pages, sources, targets):
+        self.pages = list(pages)
+        self.index = {page: i for i, page in enumerate(self.pages)}
+        self.size = len(self.pages)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+
+        # Sort links by target page
+        order = np.argsort(targets, kind="stable")
+        self.sources = sources[order]
+        self.targets = targets[order]
+        self.indptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.targets, minlength=self.size),
+                  out=self.indptr[1:])
+
+        # Each link carries 1 / (number of links on its source page)
+        self.out_degree = np.bincount(self.sources, minlength=self.size)
+        self.dangling = self.out_degree == 0
+        self.weights = 1 / self.out_degree[self.sources]
+
+        # The same links sorted by source page: the links out of page i go
+        # to pages out_targets[out_indptr[i]:out_indptr[i + 1]]
+        order = np.argsort(sources, kind="stable")
+        self.out_targets = targets[order]
+        self.out_indptr = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(self.out_degree, out=self.out_indptr[1:])
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Builds a graph from a dictionary mapping each page to the set of
+        pages it links to, as returned by crawl.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        sources = []
+        targets = []
+        for page in pages:
+            for link in corpus[page]:
+                sources.append(index[page])
+                targets.append(index[link])
+        return cls(pages, sources, targets)
+
+    def links(self):
+        """Returns the number of links in the graph."""
+        return len(self.sources)
+
+    def spread(self, rank):
+        """
+        Returns, for each page, the sum of rank / NumLinks over the pages
+        linking to it, leaving out dangling pages.
+        """
+        return np.bincount(self.targets,
+                           weights=rank[self.sources] * self.weights,
+                           minlength=self.size)
+
+    def step(self, rank, damping_factor):
+        """
+        Returns the ranks after one PageRank update of `rank`. Dangling
+        pages link to every page, which adds the same amount to each.
+        """
+        dangling = rank[self.dangling].sum()
+        return (
+            (1 - damping_factor) / self.size
+            + damping_factor * (self.spread(rank) + dangling / self.size)
+        )
+
+    def ranks(self, rank):
+        """Returns a dictionary from page name to its rank."""
+        return dict(zip(self.pages, rank.tolist()))
+
+    def save(self, filename):
+        """
+        Writes the graph to a compact binary edge-list file: a header with
+        the number of pages and links, each link as a pair of 32-bit page
+        numbers (source, target) sorted by source, then the page names one
+        per line. The links can be memory-mapped straight from the file.
+        """
+        edges = np.empty((self.links(), 2), dtype=np.int32)
+        edges[:, 0] = np.repeat(np.arange(self.size), self.out_degree)
+        edges[:, 1] = self.out_targets
+        with open(filename, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.array([self.size, self.links()], dtype=np.int64)
+                    .tobytes())
+            f.write(edges.tobytes())
+            for page in self.pages:
+                f.write(page.encode("utf-8") + b"\n")
+
+    @classmethod
+    def load(cls, filename):
+        """Reads a graph written by save."""
+        pages, edges = read_header(filename)
+        links = np.memmap(filename, dtype=np.int32, mode="r",
+                          offset=HEADER_SIZE, shape=(edges, 2))
+        with open(filename, "rb") as f:
+            f.seek(HEADER_SIZE + links.nbytes)
+            names = f.read().decode("utf-8").split("\n")[:pages]
+        return cls(names, links[:, 0], links[:, 1])
+
+
+# Start of every edge-list file, and the size of its header
+MAGIC = b"LINKS\x00\x00\x01"
+HEADER_SIZE = len(MAGIC) + 16
+
+
+def read_header(filename):
+    """
+    Returns the number of pages and of links in an edge-list file.
+    """
+    with open(filename, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+        raise ValueError(f"{filename} is not an edge-list file")
+    pages, edges = np.frombuffer(header[len(MAGIC):], dtype=np.int64)
+    return int(pages), int(edges)
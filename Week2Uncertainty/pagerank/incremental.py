@@ -0,0 +1,470 @@
+import collections
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+from graph import LinkGraph
+from pagerank import DAMPING, TOLERANCE, crawl, power_iteration
+
+# Bound on the total (L1) error of the ranks that push updates keep to
+ERROR_LIMIT = 1e-4
+
+# Fraction of ERROR_LIMIT that pushing brings the error bound back down
+# to, leaving room for later updates before pushing again
+PUSH_SHARE = 0.5
+
+# Most links followed by pushes in one update, as a fraction of the links
+# in the graph, before a change counts as too large and ranks are
+# recomputed by iteration. Pushing costs ten to twenty times as much per
+# link as a pass of power iteration, and recomputing takes many passes
+PUSH_LIMIT = 0.5
+
+# Updates made by the benchmark, each adding this many random links
+UPDATES = 50
+UPDATE_LINKS = 3
+
+# Fraction of pages whose links may differ from the stored graph before
+# the changes are merged into it
+MERGE_LIMIT = 0.01
+
+
+def main():
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python incremental.py (corpus|corpus.links|pages) "
+                 "[updates]")
+    updates = int(sys.argv[2]) if len(sys.argv) == 3 else UPDATES
+
+    # A number of pages stands for a random graph of that size
+    if sys.argv[1].isdigit():
+        graph = random_graph(int(sys.argv[1]))
+    elif os.path.isfile(sys.argv[1]):
+        graph = LinkGraph.load(sys.argv[1])
+    else:
+        graph = LinkGraph.from_corpus(crawl(sys.argv[1]))
+    print(f"{graph.size:,} pages, {graph.links():,} links")
+
+    start = time.perf_counter()
+    power_iteration(graph, DAMPING)
+    cold = time.perf_counter() - start
+    print(f"Power iteration from scratch: {cold * 1000:.1f} ms")
+
+    # Add a few random links at a time, timing each update
+    ranker = IncrementalPageRank(graph)
+    rng = np.random.default_rng(0)
+    times = []
+    recomputed = 0
+    for _ in range(updates):
+        added = [(graph.pages[source], graph.pages[target]) for source, target
+                 in rng.integers(graph.size, size=(UPDATE_LINKS, 2))]
+        start = time.perf_counter()
+        if ranker.update(added) is None:
+            recomputed += 1
+        times.append(time.perf_counter() - start)
+    print(f"{updates} updates of {UPDATE_LINKS} links: "
+          f"mean {np.mean(times) * 1000:.2f} ms, "
+          f"median {np.median(times) * 1000:.2f} ms, "
+          f"{np.mean(times) / cold:.1%} of power iteration from scratch")
+    print(f"Recomputed by power iteration: {recomputed} of {updates}")
+
+    # Compare with ranks computed from scratch for the changed graph
+    rank, _ = power_iteration(ranker.graph, DAMPING)
+    print(f"Total error: {np.abs(ranker.rank - rank).sum():.2e}, "
+          f"bound {ranker.error():.2e}")
+
+
+def random_graph(size, seed=0):
+    """
+    Returns a LinkGraph of `size` pages that looks a little like the web:
+    most links go to nearby pages, as within a site, and the rest to pages
+    drawn from a heavy-tailed distribution, so that a few pages are linked
+    to from everywhere. One page in twenty has no links.
+    """
+    rng = np.random.default_rng(seed)
+    degree = rng.integers(1, 15, size)
+    degree[rng.random(size) < 0.05] = 0
+    sources = np.repeat(np.arange(size), degree)
+    nearby = (sources + rng.integers(-50, 51, len(sources))) % size
+    popular = (rng.pareto(1.2, len(sources)) * 50).astype(np.int64) % size
+    targets = np.where(rng.random(len(sources)) < 0.8, nearby, popular)
+    keep = sources != targets
+    links = np.unique(np.stack([sources[keep], targets[keep]]), axis=1)
+    return LinkGraph([f"{page}.html" for page in range(size)],
+                     links[0], links[1])
+
+
+class ChangingGraph():
+    """
+    LinkGraph with changes to the links of some pages kept on the side.
+
+    Each change replaces the whole set of links out of one page, so a
+    PageRank step is the step over the stored graph with the changed
+    pages' old links left out and their new links added back. Once too
+    many pages have changed, the changes are merged into a new LinkGraph.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.pages = list(graph.pages)
+        self.index = dict(graph.index)
+        self.size = graph.size
+        self.changed = dict()
+        self.arrays = None
+
+    def links(self, page):
+        """Returns the set of pages linked to by page number `page`."""
+        if page in self.changed:
+            return self.changed[page]
+        if page >= self.graph.size:
+            return set()
+        start, end = self.graph.out_indptr[page:page + 2]
+        return set(self.graph.out_targets[start:end].tolist())
+
+    def change(self, page, links):
+        """Replaces the links out of page number `page`."""
+        self.changed[page] = links
+        self.arrays = None
+        if len(self.changed) > MERGE_LIMIT * self.size:
+            self.merge()
+
+    def add_page(self, page):
+        """Adds a page with no links, returning its number."""
+        self.index[page] = self.size
+        self.pages.append(page)
+        self.size += 1
+        self.changed[self.size - 1] = set()
+        self.arrays = None
+        return self.size - 1
+
+    def changed_links(self):
+        """
+        Returns the changed pages, the number of links out of each, and
+        their links as arrays of sources and targets, building the arrays
+        (and `is_changed`, a mask of the changed pages) on first use after
+        a change.
+        """
+        if self.arrays is None:
+            pages = sorted(self.changed)
+            self.is_changed = np.zeros(self.size, dtype=bool)
+            self.is_changed[pages] = True
+            degree = [len(self.changed[page]) for page in pages]
+            targets = itertools.chain.from_iterable(
+                sorted(self.changed[page]) for page in pages
+            )
+            self.arrays = (
+                np.array(pages, dtype=np.int64),
+                np.array(degree, dtype=np.int64),
+                np.repeat(np.array(pages, dtype=np.int64), degree),
+                np.fromiter(targets, np.int64, sum(degree))
+            )
+        return self.arrays
+
+    def out_links(self, pages):
+        """
+        Returns the links out of an array of page numbers, as arrays of the
+        position in `pages` of each link's source and of its target, along
+        with the number of links out of each page.
+        """
+        self.changed_links()
+        stored = ~self.is_changed[pages]
+        starts = np.where(stored, self.graph.out_indptr[
+            np.minimum(pages, self.graph.size - 1)], 0)
+        degree = np.where(stored, self.graph.out_degree[
+            np.minimum(pages, self.graph.size - 1)], 0)
+        for position in np.flatnonzero(~stored):
+            degree[position] = len(self.links(int(pages[position])))
+
+        # Offsets into out_targets of the stored pages' links, in order
+        counts = np.where(stored, degree, 0)
+        sources = np.repeat(np.arange(len(pages)), counts)
+        offsets = (np.arange(len(sources))
+                   - np.repeat(np.cumsum(counts) - counts, counts)
+                   + np.repeat(starts, counts))
+        targets = self.graph.out_targets[offsets]
+
+        # Links of changed pages, from the sets kept on the side
+        extra = [(position, sorted(self.links(int(pages[position]))))
+                 for position in np.flatnonzero(~stored)]
+        if extra:
+            sources = np.concatenate([sources] + [
+                np.full(len(links), position, dtype=np.int64)
+                for position, links in extra
+            ])
+            targets = np.concatenate([targets] + [
+                np.array(links, dtype=np.int64) for position, links in extra
+            ])
+        return sources, targets, degree
+
+    def merge(self):
+        """Builds a new LinkGraph that includes every change."""
+        changed = np.array(sorted(self.changed), dtype=np.int64)
+        kept = ~np.isin(self.graph.sources, changed)
+        sources = [self.graph.sources[kept]]
+        targets = [self.graph.targets[kept]]
+        for page, links in self.changed.items():
+            sources.append(np.full(len(links), page, dtype=np.int64))
+            targets.append(np.array(sorted(links), dtype=np.int64))
+        self.graph = LinkGraph(self.pages, np.concatenate(sources),
+                               np.concatenate(targets))
+        self.changed = dict()
+        self.arrays = None
+
+    def step(self, rank, damping_factor):
+        """
+        Returns the ranks after one PageRank update, as LinkGraph.step.
+        The changed pages' links are kept as arrays too, so the step is
+        vectorized however many pages have changed.
+        """
+        pages, degree, sources, targets = self.changed_links()
+        stored = rank[:self.graph.size].copy()
+        stored[pages[pages < self.graph.size]] = 0
+        spread = np.zeros(self.size)
+        spread[:self.graph.size] = self.graph.spread(stored)
+        spread += np.bincount(
+            targets, weights=rank[sources] / np.repeat(degree, degree),
+            minlength=self.size
+        )
+        dangling = (stored[self.graph.dangling].sum()
+                    + rank[pages[degree == 0]].sum())
+        return (
+            (1 - damping_factor) / self.size
+            + damping_factor * (spread + dangling / self.size)
+        )
+
+
+def distinct(pages):
+    """
+    Returns the distinct page numbers in an array, sorted. Sorting and
+    dropping repeats is much faster than np.unique on the small arrays
+    of each push round.
+    """
+    pages = np.sort(pages)
+    keep = np.ones(len(pages), dtype=bool)
+    keep[1:] = pages[1:] != pages[:-1]
+    return pages[keep]
+
+
+class IncrementalPageRank():
+    """
+    Keeps the PageRank of a changing link graph up to date.
+
+    Alongside the ranks, we keep the residual of every page: how far the
+    page is from satisfying PR(p) = (1 - d) / N + d * sum(PR(i) / NumLinks(i)).
+    Changing a page's links only changes the residuals of the pages it
+    linked to before and links to after, so an update adjusts those and
+    then pushes residuals through the graph (forward push), touching only
+    the pages the change reaches.
+
+    A residual r on every page leaves the ranks at most N * r / (1 - d) off
+    in total, so the total (L1) of the residuals bounds the error. It is
+    kept up to date as residuals change, and pushing starts once the bound
+    passes the error limit. Pages with the largest residuals go first:
+    every page above a threshold is pushed at once, in rounds of a few
+    vectorized operations over their links, and the threshold is lowered
+    until the bound is well within the limit. If the residuals left by
+    earlier updates elsewhere are what keep it over, every page is swept.
+
+    Rank that dangling pages spread to every page is kept as one uniform
+    residual. Since PageRank scales with the (1 - d) / N that every page
+    gets, a uniform residual is taken up exactly by scaling every rank.
+
+    Ranks are recomputed by power iteration, starting from the current
+    ranks rather than from 1 / N, only when a change reaches too many
+    pages, or pages are added (which changes N and so every rank).
+    """
+
+    def __init__(self, corpus, damping_factor=DAMPING, tolerance=TOLERANCE,
+                 error_limit=ERROR_LIMIT):
+        graph = corpus if isinstance(corpus, LinkGraph) \
+            else LinkGraph.from_corpus(corpus)
+        self.graph = ChangingGraph(graph)
+        self.damping_factor = damping_factor
+        self.tolerance = tolerance
+        self.error_limit = error_limit
+        self.rank = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Recomputes ranks by power iteration, starting from the current
+        ranks if there are any, and resets the residuals exactly. Returns
+        the number of iterations taken.
+        """
+
+        # Ranks sum to 1, and mass lost or gained by pushes would take
+        # power iteration many passes to put right
+        if self.rank is not None:
+            self.rank = self.rank / self.rank.sum()
+        self.rank, iterations = power_iteration(
+            self.graph, self.damping_factor, self.tolerance, rank=self.rank
+        )
+        self.residual = (self.graph.step(self.rank, self.damping_factor)
+                         - self.rank)
+        self.total = np.abs(self.residual).sum()
+        self.uniform = 0.0
+        return iterations
+
+    def update(self, added=(), removed=()):
+        """
+        Applies lists of added and removed links, as (source, target) page
+        name pairs, and brings the ranks up to date. Links to or from new
+        pages add those pages. Returns the number of pushes made, or None
+        if the ranks were recomputed by power iteration.
+        """
+        changes = collections.defaultdict(lambda: ([], []))
+        old = self.graph.size
+        for position, links in enumerate((removed, added)):
+            for source, target in links:
+                for page in (source, target):
+                    if page not in self.graph.index:
+                        self.graph.add_page(page)
+                if source != target:
+                    changes[self.graph.index[source]][position].append(
+                        self.graph.index[target]
+                    )
+
+        # With more pages, every rank changes: start from the old ranks,
+        # scaled down to make room for the new pages
+        if self.graph.size > old:
+            for source, (removals, additions) in changes.items():
+                links = self.graph.links(source)
+                self.graph.change(source, links.difference(removals)
+                                  .union(additions))
+            size = self.graph.size
+            self.rank = np.concatenate([
+                self.rank * old / size, np.full(size - old, 1 / size)
+            ])
+            self.refresh()
+            return None
+
+        # Replace each changed page's share of rank in the residuals
+        touched = set()
+        for source, (removals, additions) in changes.items():
+            links = self.graph.links(source)
+            share = self.damping_factor * self.rank[source]
+            self.spread(links, -share, touched)
+            links = links.difference(removals).union(additions)
+            self.spread(links, share, touched)
+            self.graph.change(source, links)
+        return self.push(touched)
+
+    def spread(self, links, amount, touched):
+        """
+        Adds `amount` to the residuals, divided evenly among `links`, or
+        among every page if there are no links.
+        """
+        if not links:
+            self.uniform += amount / self.graph.size
+            return
+        share = amount / len(links)
+        for target in links:
+            old = self.residual[target]
+            self.residual[target] = old + share
+            self.total += abs(old + share) - abs(old)
+            touched.add(target)
+
+    def push(self, touched):
+        """
+        Moves residuals into ranks, starting from the `touched` pages, once
+        the error bound is past the limit, until it is back within
+        PUSH_SHARE of the limit. Returns the number of pushes made, or None
+        if the change reached so far that ranks were recomputed by power
+        iteration instead.
+        """
+        if self.error() <= self.error_limit:
+            return 0
+
+        # With every residual below the floor, the bound is within target
+        target = PUSH_SHARE * self.error_limit
+        floor = target * (1 - self.damping_factor) / self.graph.size
+        budget = PUSH_LIMIT * self.graph.graph.links()
+        reached = np.fromiter(touched, np.int64, len(touched))
+        limit = max(floor, np.abs(self.residual[reached]).max(initial=0) / 4)
+        pushes = 0
+        followed = 0
+        while self.error() > target:
+
+            # Push the pages reached so far that are above the threshold,
+            # and those their pushes raise above it, then lower it
+            frontier = reached[np.abs(self.residual[reached]) > limit]
+            pages = [reached]
+            while len(frontier) and self.error() > target:
+                pushes += len(frontier)
+                changed, frontier, links = self.push_round(frontier, limit)
+                pages.append(changed)
+                followed += links
+                if followed > budget:
+                    self.refresh()
+                    return None
+            if self.uniform:
+                self.scale()
+            if limit > floor:
+                reached = distinct(np.concatenate(pages))
+                limit = max(floor, limit / 4)
+                continue
+
+            # With every page the change reached below the floor, what is
+            # left over is the residuals of earlier updates, anywhere
+            total = np.abs(self.residual).sum()
+            if len(reached) == self.graph.size and total == self.total:
+                break
+            self.total = total
+            reached = np.arange(self.graph.size)
+        return pushes
+
+    def push_round(self, frontier, limit):
+        """
+        Pushes every page in `frontier` at once, keeping the total of the
+        residuals up to date. Returns the pages whose residuals changed,
+        those of them now above `limit`, and the number of links followed.
+        """
+        amount = self.residual[frontier]
+        sources, targets, degree = self.graph.out_links(frontier)
+        pages = distinct(np.concatenate([frontier, targets]))
+        before = np.abs(self.residual[pages]).sum()
+
+        # Each page passes on a damped share of what it gained, evenly
+        # over its links, or over every page if it has none
+        self.rank[frontier] += amount
+        self.residual[frontier] = 0
+        passed = self.damping_factor * amount
+        linked = degree > 0
+        np.add.at(self.residual, targets,
+                  passed[sources] / degree[sources])
+        self.uniform += passed[~linked].sum() / self.graph.size
+
+        residual = self.residual[pages]
+        self.total += np.abs(residual).sum() - before
+        return pages, pages[np.abs(residual) > limit], len(targets)
+
+    def scale(self):
+        """
+        Takes up the uniform residual u exactly: every rank, and with it
+        every residual, is scaled by 1 + u / ((1 - d) / N - u), which
+        raises what each page gets from jumping at random by u.
+        """
+        jump = (1 - self.damping_factor) / self.graph.size
+        factor = 1 + self.uniform / (jump - self.uniform)
+        self.rank *= factor
+        self.residual *= factor
+        self.total *= abs(factor)
+        self.uniform = 0.0
+
+    def error(self):
+        """
+        Returns a bound on the total (L1) error of the current ranks, from
+        the running total of the residuals rather than a pass over them.
+        """
+        residual = (max(self.total, 0.0)
+                    + abs(self.uniform) * self.graph.size)
+        return residual / (1 - self.damping_factor)
+
+    def ranks(self):
+        """Returns a dictionary from page name to its rank."""
+        return dict(zip(self.graph.pages, self.rank.tolist()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import sys
+import time
+
+import numpy as np
+
+from graph import HEADER_SIZE, read_header
+from pagerank import DAMPING, MAX_ITERATIONS, TOLERANCE
+
+# Links read from the edge-list file at a time
+BLOCK_SIZE = 1 << 22
+
+
+def main():
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python outofcore.py graph [block_size]")
+    block_size = int(sys.argv[2]) if len(sys.argv) == 3 else BLOCK_SIZE
+    rank, _ = stream_pagerank(sys.argv[1], DAMPING, block_size=block_size)
+    top = np.argsort(-rank)[:10]
+    names = page_names(sys.argv[1], set(top.tolist()))
+    print("Highest PageRank")
+    for page in top:
+        print(f"  {names[page]}: {rank[page]:.6f}")
+
+
+def edges(filename):
+    """
+    Memory-maps the links of an edge-list file written by LinkGraph.save.
+    Returns the number of pages and an array of (source, target) rows.
+    """
+    pages, links = read_header(filename)
+    return pages, np.memmap(filename, dtype=np.int32, mode="r",
+                            offset=HEADER_SIZE, shape=(links, 2))
+
+
+def blocks(links, block_size):
+    """Yields consecutive blocks of links, each read into memory."""
+    for start in range(0, len(links), block_size):
+        yield np.array(links[start:start + block_size], dtype=np.int64)
+
+
+def stream_pagerank(filename, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS, block_size=BLOCK_SIZE,
+                    verbose=True):
+    """
+    Runs the power method over a graph too large to hold in memory,
+    reading its links from an edge-list file `block_size` links at a time
+    on each iteration. Only the current and next rank vectors and each
+    page's number of links are kept in memory. Prints the change in rank
+    and the links processed per second on every iteration if `verbose`.
+
+    Returns the array of ranks and the number of iterations taken.
+    """
+    size, links = edges(filename)
+
+    # Links are sorted by source, so each block only covers a range of
+    # source pages, and counting their links needs no sorting
+    out_degree = np.zeros(size, dtype=np.int64)
+    for block in blocks(links, block_size):
+        first = block[0, 0]
+        counts = np.bincount(block[:, 0] - first)
+        out_degree[first:first + len(counts)] += counts
+    dangling = out_degree == 0
+
+    rank = np.full(size, 1 / size)
+    for iteration in range(1, max_iterations + 1):
+        start = time.perf_counter()
+
+        # Each link carries rank / NumLinks of its source to its target
+        spread = np.zeros(size)
+        for block in blocks(links, block_size):
+            sources = block[:, 0]
+            np.add.at(spread, block[:, 1],
+                      rank[sources] / out_degree[sources])
+        new_rank = spread
+        new_rank *= damping_factor
+        new_rank += ((1 - damping_factor) / size
+                     + damping_factor * rank[dangling].sum() / size)
+
+        change = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(f"Iteration {iteration}: change {change:.3e}, "
+                  f"{len(links) / elapsed:,.0f} links per second")
+        if change < tolerance:
+            break
+    return rank, iteration
+
+
+def page_names(filename, pages):
+    """
+    Returns a dictionary from page number to name for the page numbers in
+    `pages`, reading the names at the end of an edge-list file one line
+    at a time.
+    """
+    size, links = read_header(filename)
+    names = dict()
+    with open(filename, "rb") as f:
+        f.seek(HEADER_SIZE + links * 8)
+        for number, line in enumerate(f):
+            if number >= size:
+                break
+            if number in pages:
+                names[number] = line.rstrip(b"\n").decode("utf-8")
+    return names
+
+
+if __name__ == "__main__":
+    main()
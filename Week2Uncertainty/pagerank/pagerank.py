@@ -1,15 +1,54 @@
+import math
 import os
 import random
 import re
 import sys
 
+import numpy as np
+
+from graph import LinkGraph
+
 DAMPING = 0.85
 SAMPLES = 10000
 
+# Largest total change in PageRank (L1 norm) at which iteration stops
+TOLERANCE = 1e-8
+
+# Most iterations of the power method before giving up
+MAX_ITERATIONS = 1000
+
+# Random surfers walking side by side when sampling with NumPy
+SURFERS = 1000
+
+# Distance from PageRank, relative to a uniform start, that surfers walk
+# off before their visits are counted
+BURN_IN_ERROR = 1e-4
+
+# Blocks of pages updated in turn by each Gauss-Seidel sweep
+SWEEP_BLOCKS = 64
+
+# Power iterations between extrapolations in the accelerated methods
+EXTRAPOLATE_EVERY = 10
+
 
 def main():
     if len(sys.argv) != 2:
         sys.exit("Usage: python pagerank.py corpus")
+
+    # An edge-list file written by crawler.py is loaded directly, and
+    # ranked with the methods that work on a LinkGraph
+    if os.path.isfile(sys.argv[1]):
+        graph = LinkGraph.load(sys.argv[1])
+        ranks = sample_pagerank(graph, DAMPING, SAMPLES, "vectorized")
+        print(f"PageRank Results from Sampling (n = {SAMPLES})")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f}")
+        ranks = iterate_pagerank(graph, DAMPING, "power")
+        print(f"PageRank Results from Iteration")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f}")
+        return
+
     corpus = crawl(sys.argv[1])
     ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
@@ -82,7 +121,7 @@ def transition_model(corpus, page, damping_factor):
     #print(probability_destribution)
     return probability_destribution
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, method="loops"):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
@@ -90,7 +129,20 @@ def sample_pagerank(corpus, damping_factor, n):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    With method "vectorized", the corpus (or a LinkGraph) is turned into a
+    sparse link graph once, and SURFERS random surfers walk it together
+    as NumPy arrays, taking about n / SURFERS counted steps each after
+    an uncounted burn-in.
     """
+    if method == "vectorized":
+        graph = corpus if isinstance(corpus, LinkGraph) \
+            else LinkGraph.from_corpus(corpus)
+        counts = surf(graph, damping_factor, n)
+        return graph.ranks(counts / counts.sum())
+    if method != "loops":
+        raise ValueError(f"unknown method {method}")
+
     estimated_pagerank = dict()
     # We need to count how frequently a key appears, according to our 
     # transition model.
@@ -133,7 +185,45 @@ def sample_pagerank(corpus, damping_factor, n):
     return estimated_pagerank
 
 
-def iterate_pagerank(corpus, damping_factor):
+def surf(graph, damping_factor, n, surfers=SURFERS):
+    """
+    Walks random surfers over a LinkGraph in parallel, each starting on a
+    page at random, until at least `n` pages have been visited in total.
+    Returns the number of visits to each page.
+
+    Each surfer walks only about n / surfers counted steps, too few to
+    forget its uniform start, so visits are only counted after a burn-in
+    of log(BURN_IN_ERROR) / log(damping_factor) steps: the chance of not
+    having jumped to a random page yet, the only part of the walk that
+    still depends on the start, is then below BURN_IN_ERROR.
+
+    At each step a surfer follows one of its page's links, chosen
+    uniformly by its offset into the page's outgoing links, or with
+    probability 1 - damping_factor (or always, on a dangling page) jumps
+    to a page chosen from the whole corpus. The generator is seeded from
+    `random`, so random.seed makes sampling repeatable.
+    """
+    generator = np.random.default_rng(random.getrandbits(64))
+    surfers = max(1, min(surfers, n))
+    steps = -(-n // surfers)
+    burn_in = (math.ceil(math.log(BURN_IN_ERROR) / math.log(damping_factor))
+               if 0 < damping_factor < 1 else 0)
+    counts = np.zeros(graph.size, dtype=np.int64)
+
+    page = generator.integers(graph.size, size=surfers)
+    for step in range(burn_in + steps):
+        if step >= burn_in:
+            counts += np.bincount(page, minlength=graph.size)
+        degree = graph.out_degree[page]
+        follow = (generator.random(surfers) < damping_factor) & (degree > 0)
+        offset = (generator.random(surfers) * degree).astype(np.int64)
+        links = graph.out_indptr[page[follow]] + offset[follow]
+        page = generator.integers(graph.size, size=surfers)
+        page[follow] = graph.out_targets[links]
+    return counts
+
+
+def iterate_pagerank(corpus, damping_factor, method="loops", verbose=False):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -141,7 +231,32 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    Any other method than "loops" turns the corpus (or a LinkGraph) into a
+    sparse link graph once, and runs one of the SOLVERS on it with
+    vectorized operations until the total change falls below TOLERANCE:
+    "power" for the power method, "gauss-seidel" for Gauss-Seidel
+    sweeps, or "aitken" or "quadratic" for the power method with periodic
+    Aitken or quadratic extrapolation. Each reports how many passes over
+    the links it took and checks the residual of its result, and with
+    `verbose` prints the change after every pass.
     """
+    if method in SOLVERS:
+        graph = corpus if isinstance(corpus, LinkGraph) \
+            else LinkGraph.from_corpus(corpus)
+        changes = []
+        rank, passes = SOLVERS[method](graph, damping_factor,
+                                       changes=changes)
+        if verbose:
+            for number, change in enumerate(changes, 1):
+                print(f"  Pass {number}: change {change:.3e}")
+        error = residual(graph, rank, damping_factor)
+        print(f"Iteration ({method}): {passes} passes, residual {error:.2e}"
+              + ("" if error < TOLERANCE else ", NOT converged"))
+        return graph.ranks(rank)
+    if method != "loops":
+        raise ValueError(f"unknown method {method}")
+
     # We assign each page a rank of 1 / N.
     estimated_pagerank = {key: 1 / len(corpus) for key in corpus}
     new_pageranks = {key: 0 for key in corpus}
@@ -176,5 +291,156 @@ def iterate_pagerank(corpus, damping_factor):
     print('Iteration: ', round(sum(estimated_pagerank.values()), 4))
     return estimated_pagerank
 
+
+def residual(graph, rank, damping_factor):
+    """
+    Returns how far ranks are from satisfying the PageRank equations, as
+    the total (L1) change one more update would make.
+    """
+    return np.abs(graph.step(rank, damping_factor) - rank).sum()
+
+
+def power_iteration(graph, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS, rank=None, changes=None):
+    """
+    Runs the power method on a LinkGraph, starting from ranks of 1 / N,
+    or from `rank` if given (such as the ranks before the graph changed).
+    Returns the array of ranks and the number of iterations taken. The
+    change made by each iteration is appended to `changes`, if given.
+    """
+    if rank is None:
+        rank = np.full(graph.size, 1 / graph.size)
+    for iteration in range(1, max_iterations + 1):
+        new_rank = graph.step(rank, damping_factor)
+        change = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if changes is not None:
+            changes.append(change)
+        if change < tolerance:
+            break
+    return rank, iteration
+
+
+def gauss_seidel(graph, damping_factor, tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS, rank=None, changes=None,
+                 blocks=SWEEP_BLOCKS):
+    """
+    Solves for PageRank with Gauss-Seidel sweeps over a LinkGraph: each
+    sweep updates the pages one block at a time, and later blocks already
+    use the new ranks of earlier ones, which usually takes fewer sweeps
+    than the power method. Blocks are updated with vectorized operations
+    over the links into them. Arguments and result as power_iteration.
+    """
+    if rank is None:
+        rank = np.full(graph.size, 1 / graph.size)
+    rank = rank.copy()
+    bounds = np.linspace(0, graph.size, min(blocks, graph.size) + 1)
+    bounds = np.unique(bounds.astype(np.int64))
+    dangling = rank[graph.dangling].sum()
+    for iteration in range(1, max_iterations + 1):
+        change = 0
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            first, last = graph.indptr[start], graph.indptr[end]
+            sources = graph.sources[first:last]
+            spread = np.bincount(
+                graph.targets[first:last] - start,
+                weights=rank[sources] * graph.weights[first:last],
+                minlength=end - start
+            )
+            new_rank = (
+                (1 - damping_factor) / graph.size
+                + damping_factor * (spread + dangling / graph.size)
+            )
+            difference = new_rank - rank[start:end]
+            change += np.abs(difference).sum()
+            dangling += difference[graph.dangling[start:end]].sum()
+            rank[start:end] = new_rank
+
+        # The ranks always sum to 1, which the sweep alone does not keep
+        total = rank.sum()
+        change += abs(total - 1)
+        rank /= total
+        dangling = rank[graph.dangling].sum()
+        if changes is not None:
+            changes.append(change)
+        if change < tolerance:
+            break
+    return rank, iteration
+
+
+def aitken(previous, last, current):
+    """
+    Returns Aitken's delta-squared extrapolation of three successive
+    iterates, page by page, keeping the current rank wherever the
+    extrapolation is undefined or negative.
+    """
+    second = current - 2 * last + previous
+    safe = np.abs(second) > 1e-15
+    step = np.zeros_like(current)
+    step[safe] = (current[safe] - last[safe]) ** 2 / second[safe]
+    extrapolated = current - step
+    return np.where(extrapolated > 0, extrapolated, current)
+
+
+def quadratic(iterates):
+    """
+    Returns the quadratic extrapolation of four successive iterates
+    (Kamvar et al., 2003), which assumes the current iterate is a
+    combination of the PageRank vector and the next two eigenvectors.
+    """
+    first, second, third, fourth = iterates
+    differences = np.column_stack([second - first, third - first])
+    gamma, *_ = np.linalg.lstsq(differences, -(fourth - first), rcond=None)
+    gamma = [gamma[0], gamma[1], 1]
+    beta = [sum(gamma), gamma[1] + gamma[2], gamma[2]]
+    extrapolated = beta[0] * second + beta[1] * third + beta[2] * fourth
+    return np.where(extrapolated > 0, extrapolated, fourth)
+
+
+def extrapolated_iteration(graph, damping_factor, tolerance=TOLERANCE,
+                           max_iterations=MAX_ITERATIONS, rank=None,
+                           changes=None, method="aitken"):
+    """
+    Runs the power method, replacing the ranks by an extrapolation from
+    the last few iterates every EXTRAPOLATE_EVERY iterations, which
+    cancels the slowest decaying error terms. Extrapolation makes no pass
+    over the links. Arguments and result as power_iteration.
+    """
+    if rank is None:
+        rank = np.full(graph.size, 1 / graph.size)
+    iterates = [rank]
+    for iteration in range(1, max_iterations + 1):
+        new_rank = graph.step(rank, damping_factor)
+        change = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if changes is not None:
+            changes.append(change)
+        if change < tolerance:
+            break
+
+        iterates = iterates[-3:] + [rank]
+        if iteration % EXTRAPOLATE_EVERY == 0:
+            if method == "aitken":
+                rank = aitken(*iterates[-3:])
+            else:
+                rank = quadratic(iterates)
+            rank = rank / rank.sum()
+            iterates = [rank]
+    return rank, iteration
+
+
+# Iterative solvers that iterate_pagerank can use on a LinkGraph
+SOLVERS = {
+    "power": power_iteration,
+    "gauss-seidel": gauss_seidel,
+    "aitken": lambda *args, **kwargs: extrapolated_iteration(
+        *args, **kwargs, method="aitken"
+    ),
+    "quadratic": lambda *args, **kwargs: extrapolated_iteration(
+        *args, **kwargs, method="quadratic"
+    ),
+}
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,107 @@
+import collections
+
+from graph import LinkGraph
+from pagerank import DAMPING
+
+# Residual per link below which a page is not pushed: the result for each
+# page is within PUSH_EPSILON times its number of links of the true score
+PUSH_EPSILON = 1e-4
+
+# Most seed sets whose results are remembered
+CACHE_SIZE = 1024
+
+
+class PersonalizedPageRank():
+    """
+    Answers personalized PageRank queries: the random surfer jumps back to
+    a set of seed pages (chosen uniformly) instead of to any page in the
+    corpus, so scores measure how related each page is to the seeds.
+    Dangling pages also send the surfer back to the seeds.
+
+    Scores are approximated by forward push. Every page holds an estimate
+    and a residual of rank not yet passed on, starting with the seeds'
+    residuals summing to 1. Pushing a page moves 1 - d of its residual into
+    its estimate and spreads the rest over its links. Only pages whose
+    residual is large compared with their number of links are pushed, so a
+    query only visits the neighborhood of the seeds, however big the graph.
+    Results are kept in a least recently used cache by seed set.
+    """
+
+    def __init__(self, corpus, damping_factor=DAMPING, epsilon=PUSH_EPSILON,
+                 cache_size=CACHE_SIZE):
+        self.graph = corpus if isinstance(corpus, LinkGraph) \
+            else LinkGraph.from_corpus(corpus)
+        self.damping_factor = damping_factor
+        self.epsilon = epsilon
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+
+    def query(self, seeds):
+        """
+        Returns a dictionary from page name to personalized PageRank with
+        respect to the seed pages, leaving out pages with no score. The
+        dictionary is a copy, so changing it leaves the cache alone.
+        """
+        key = frozenset(seeds)
+        if not key:
+            raise ValueError("need at least one seed page")
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return dict(self.cache[key])
+
+        scores = self.push([self.graph.index[page] for page in sorted(key)])
+        result = {self.graph.pages[page]: score
+                  for page, score in scores.items()}
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return dict(result)
+
+    def related(self, seeds, k=10):
+        """
+        Returns the k pages other than the seeds most related to them, as
+        (page, score) pairs from highest to lowest score.
+        """
+        seeds = set(seeds)
+        scores = self.query(seeds)
+        pages = sorted((page for page in scores if page not in seeds),
+                       key=lambda page: -scores[page])
+        return [(page, scores[page]) for page in pages[:k]]
+
+    def push(self, seeds):
+        """
+        Runs forward push from a list of seed page numbers. Returns a
+        dictionary from page number to estimated score.
+        """
+        graph = self.graph
+        estimate = collections.defaultdict(float)
+        residual = collections.defaultdict(float)
+        for seed in seeds:
+            residual[seed] += 1 / len(seeds)
+
+        def ready(page):
+            """Checks if a page's residual is large enough to push."""
+            links = max(int(graph.out_degree[page]), 1)
+            return residual[page] >= self.epsilon * links
+
+        queue = collections.deque(page for page in residual if ready(page))
+        queued = set(queue)
+        while queue:
+            page = queue.popleft()
+            queued.discard(page)
+            amount = residual.pop(page)
+            estimate[page] += (1 - self.damping_factor) * amount
+
+            # Spread the rest over the page's links, or back to the seeds
+            start, end = graph.out_indptr[page:page + 2]
+            if start == end:
+                targets = seeds
+            else:
+                targets = graph.out_targets[start:end].tolist()
+            share = self.damping_factor * amount / len(targets)
+            for target in targets:
+                residual[target] += share
+                if target not in queued and ready(target):
+                    queued.add(target)
+                    queue.append(target)
+        return dict(estimate)